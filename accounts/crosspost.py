@@ -0,0 +1,299 @@
+"""Durable crosspost queue.
+
+Publishing a note creates one pending NoteCrosspost row per selected network
+(``enqueue_crossposts``). A fixed pool of worker threads claims rows that are
+due and posts them with the helpers in ``accounts.social``, at most
+``CROSSPOST_NETWORK_CONCURRENCY[network]`` at a time per network. A worker that
+claims a row also claims the note's other due rows and posts to those networks
+concurrently, recording each result as it arrives, so a note takes as long as
+its slowest network rather than the sum of all of them. Failures are retried
+with exponential backoff until ``CROSSPOST_MAX_ATTEMPTS``.
+
+The pool runs inside the app process (``CROSSPOST_WORKERS`` threads) or on its
+own with ``manage.py crosspost_worker``. Jobs live in the database, so a
+recycled or crashed process leaves nothing behind: a claimed row whose worker
+died becomes due again when its lease runs out.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from aether_notes.models import NoteCrosspost
+from aether_notes.writer import run_write
+
+from .models import Profile
+from .social import post_bluesky, post_mastodon, post_status_cafe
+
+logger = logging.getLogger(__name__)
+
+NETWORKS = ("mastodon", "bluesky", "status_cafe")
+
+
+def enqueue_crossposts(
+    note,
+    profile: Profile,
+    *,
+    want_masto: bool,
+    want_bluesky: bool,
+    want_status_cafe: bool,
+    status_cafe_face: str | None = None,
+) -> list[str]:
+    """Queue the note for the networks selected on it that are also enabled on the profile.
+
+    Returns the networks queued.
+    """
+    networks = []
+    if want_masto and profile.crosspost_mastodon:
+        networks.append("mastodon")
+    if want_bluesky and profile.crosspost_bluesky:
+        networks.append("bluesky")
+    if want_status_cafe and profile.crosspost_status_cafe:
+        networks.append("status_cafe")
+    if not networks:
+        return []
+
+    now = timezone.now()
+    rows = [
+        NoteCrosspost(
+            note=note,
+            network=network,
+            status=NoteCrosspost.PENDING,
+            next_attempt_at=now,
+            face=(status_cafe_face or "")[:8] if network == "status_cafe" else "",
+        )
+        for network in networks
+    ]
+    run_write(NoteCrosspost.objects.bulk_create, rows, ignore_conflicts=True)
+    if settings.CROSSPOST_WORKERS:
+        pool.start(settings.CROSSPOST_WORKERS)
+        transaction.on_commit(pool.wake)
+    return networks
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """Backoff before the next try after ``attempts`` failed ones, with jitter."""
+    seconds = min(
+        settings.CROSSPOST_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+        settings.CROSSPOST_RETRY_MAX_SECONDS,
+    )
+    return datetime.timedelta(seconds=seconds * random.uniform(0.75, 1.25))
+
+
+def claim(network: str, note_id: int | None = None) -> NoteCrosspost | None:
+    """Take the most overdue pending row for ``network`` (of ``note_id``, if given).
+
+    Returns None if there is none, or if another worker won it.
+    """
+    now = timezone.now()
+    due = NoteCrosspost.objects.filter(network=network, status=NoteCrosspost.PENDING, next_attempt_at__lte=now)
+    if note_id is not None:
+        due = due.filter(note_id=note_id)
+    due = (
+        due.order_by("next_attempt_at")
+        .values_list("pk", "next_attempt_at")
+        .first()
+    )
+    if due is None:
+        return None
+    pk, next_attempt_at = due
+    # Only one worker's UPDATE matches the row it read; the lease keeps the row
+    # from being claimed again while the post is in flight.
+    claimed = run_write(
+        NoteCrosspost.objects.filter(pk=pk, status=NoteCrosspost.PENDING, next_attempt_at=next_attempt_at).update,
+        next_attempt_at=now + datetime.timedelta(seconds=settings.CROSSPOST_LEASE_SECONDS),
+        attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return None
+    return NoteCrosspost.objects.select_related("note__user__profile").get(pk=pk)
+
+
+def _post(crosspost: NoteCrosspost, profile: Profile) -> tuple[bool, bool, str | None, str | None]:
+    """Post the note to the crosspost's network. Returns (ok, retryable, remote_id, remote_url)."""
+    text = crosspost.note.text
+    if crosspost.network == "mastodon":
+        ok, remote_id, remote_url = post_mastodon(profile, text)
+    elif crosspost.network == "bluesky":
+        ok, remote_id, remote_url = post_bluesky(profile, text)
+    else:
+        username = profile.status_cafe_username
+        if not username or not profile.status_cafe_password or not profile.crosspost_status_cafe:
+            return False, False, None, None
+        ok = post_status_cafe(profile, text, face=crosspost.face or None)
+        remote_id, remote_url = None, f"https://status.cafe/users/{username}"
+    if not ok and remote_id == "disabled_or_missing":
+        # Turned off or credentials removed since the note was queued.
+        return False, False, None, None
+    return ok, True, remote_id, remote_url
+
+
+def process(crosspost: NoteCrosspost) -> bool:
+    """Attempt a claimed crosspost and record the outcome. Returns whether it was posted."""
+    note = crosspost.note
+    profile = getattr(note.user, "profile", None) if note.user_id else None
+    if profile is None or note.is_draft:
+        run_write(crosspost.mark_error, "note_unavailable")
+        return False
+
+    ok, retryable, remote_id, remote_url = _post(crosspost, profile)
+    if ok:
+        run_write(crosspost.mark_success, remote_id=remote_id, remote_url=remote_url)
+        others_failing = note.crossposts.exclude(pk=crosspost.pk).exclude(status=NoteCrosspost.SUCCESS).exists()
+        if not others_failing and (profile.last_crosspost_error or profile.last_crosspost_error_at):
+            run_write(profile.clear_crosspost_error)
+        return True
+
+    message = (profile.last_crosspost_error or "post_failed") if retryable else "disabled_or_missing"
+    retry_at = None
+    if retryable and crosspost.attempts < settings.CROSSPOST_MAX_ATTEMPTS:
+        retry_at = timezone.now() + retry_delay(crosspost.attempts)
+    run_write(crosspost.mark_error, message, retry_at)
+    return False
+
+
+def _process_in_thread(crosspost: NoteCrosspost) -> bool:
+    # Executor threads outlive the job; don't leave connections open in them.
+    try:
+        return process(crosspost)
+    finally:
+        connections.close_all()
+
+
+class CrosspostPool:
+    """A fixed number of worker threads draining the crosspost queue."""
+
+    def __init__(self):
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self, workers: int) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._slots = {
+                network: threading.BoundedSemaphore(settings.CROSSPOST_NETWORK_CONCURRENCY.get(network, 1))
+                for network in NETWORKS
+            }
+            # Never more posts in flight than the per-network slots allow.
+            self._executor = ThreadPoolExecutor(
+                max_workers=sum(settings.CROSSPOST_NETWORK_CONCURRENCY.get(network, 1) for network in NETWORKS),
+                thread_name_prefix="crosspost-post",
+            )
+            for i in range(workers):
+                thread = threading.Thread(target=self._run, name=f"crosspost-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Let the workers finish the post in hand, then stop them."""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # Workers that outlived the join see _stop (or the shut-down
+            # executor) in _fan_out and leave their claimed rows to the lease.
+            executor.shutdown(wait=False)
+
+    def run_once(self) -> bool:
+        """Process one note's due crossposts on networks with a free slot. Returns False if there were none."""
+        for network in random.sample(NETWORKS, len(NETWORKS)):
+            jobs = self._claim(network)
+            if jobs:
+                jobs += self._claim_siblings(jobs[0][0])
+                self._fan_out(jobs)
+                return True
+        return False
+
+    def _claim(self, network: str, note_id: int | None = None) -> list[tuple[NoteCrosspost, threading.Semaphore]]:
+        slot = self._slots[network]
+        if not slot.acquire(blocking=False):
+            return []
+        try:
+            crosspost = claim(network, note_id)
+        except BaseException:
+            slot.release()
+            raise
+        if crosspost is None:
+            slot.release()
+            return []
+        return [(crosspost, slot)]
+
+    def _claim_siblings(self, crosspost: NoteCrosspost) -> list[tuple[NoteCrosspost, threading.Semaphore]]:
+        networks = (
+            NoteCrosspost.objects.filter(
+                note_id=crosspost.note_id, status=NoteCrosspost.PENDING, next_attempt_at__lte=timezone.now()
+            )
+            .exclude(pk=crosspost.pk)
+            .values_list("network", flat=True)
+        )
+        jobs = []
+        for network in networks:
+            jobs += self._claim(network, crosspost.note_id)
+        return jobs
+
+    def _fan_out(self, jobs: list[tuple[NoteCrosspost, threading.Semaphore]]) -> None:
+        """Post the claimed crossposts side by side; each records its own outcome as it finishes."""
+        if len(jobs) == 1:
+            crosspost, slot = jobs[0]
+            try:
+                process(crosspost)
+            finally:
+                slot.release()
+            return
+        executor = self._executor
+        futures = {}
+        for crosspost, slot in jobs:
+            if executor is None or self._stop.is_set():
+                # Stopping: the row becomes due again when its lease runs out.
+                slot.release()
+                continue
+            try:
+                futures[executor.submit(_process_in_thread, crosspost)] = slot
+            except RuntimeError:
+                # stop() shut the executor down after we read it.
+                slot.release()
+        for future in as_completed(futures):
+            futures[future].release()
+            if future.exception() is not None:
+                logger.error("Crosspost failed", exc_info=future.exception())
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                # Like a request would: drop connections that broke or aged out.
+                close_old_connections()
+                try:
+                    worked = self.run_once()
+                except Exception:
+                    logger.exception("Crosspost worker failed")
+                    worked = False
+                if not worked:
+                    self._wake.wait(settings.CROSSPOST_POLL_SECONDS)
+                    self._wake.clear()
+        finally:
+            connections.close_all()
+
+
+pool = CrosspostPool()
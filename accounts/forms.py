@@ -71,6 +71,11 @@ class ProfileForm(forms.ModelForm):
             profile.bluesky_app_password = self.cleaned_data.get("bluesky_app_password") or ""
         if "status_cafe_password" in self.cleaned_data:
             profile.status_cafe_password = self.cleaned_data.get("status_cafe_password") or ""
+        # Stored sessions belong to the old account/password.
+        if {"bluesky_handle", "bluesky_app_password"} & set(self.changed_data):
+            profile.bluesky_session = ""
+        if {"status_cafe_username", "status_cafe_password"} & set(self.changed_data):
+            profile.status_cafe_session = ""
         if commit:
             profile.save()
         return profile
@@ -0,0 +1,27 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.crosspost import pool
+
+
+class Command(BaseCommand):
+    help = "Send queued crossposts until interrupted (run with CROSSPOST_WORKERS=0 in the app)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.CROSSPOST_WORKERS or 2)
+
+    def handle(self, *args, workers, **options):
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        pool.start(workers)
+        self.stdout.write(self.style.SUCCESS(f"Crosspost worker running with {workers} thread(s)."))
+        try:
+            while not stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Stopping after the posts in flight…")
+        pool.stop()
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Expression index for case-insensitive username lookups (accounts.usernames)."""
+
+    dependencies = [
+        ('accounts', '0005_remove_profile_status_cafe_default_face'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_username_lower_idx ON auth_user (LOWER(username));',
+            'DROP INDEX IF EXISTS auth_user_username_lower_idx;',
+        ),
+    ]
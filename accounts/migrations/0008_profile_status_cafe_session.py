@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:11
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_profile_bluesky_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='status_cafe_session',
+            field=accounts.fields.EncryptedTextField(blank=True),
+        ),
+    ]
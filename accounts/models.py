@@ -21,10 +21,16 @@ class Profile(models.Model):
     # Bluesky
     bluesky_handle = models.CharField(max_length=100, blank=True)
     bluesky_app_password = EncryptedTextField(blank=True)
+    # Exported atproto session (access + refresh JWTs), reused between posts so
+    # we don't log in each time. Cleared when the handle or app password changes.
+    bluesky_session = EncryptedTextField(blank=True)
 
     # Status.cafe (HTML form scraping integration)
     status_cafe_username = models.CharField(max_length=100, blank=True)
     status_cafe_password = EncryptedTextField(blank=True)
+    # Signed-in cookie jar and post-form CSRF token (JSON), reused until
+    # status.cafe stops accepting them. Cleared when the credentials change.
+    status_cafe_session = EncryptedTextField(blank=True)
 
     # Preferences
     crosspost_mastodon = models.BooleanField(default=False)
@@ -51,6 +57,21 @@ class Profile(models.Model):
         self.last_crosspost_error_at = timezone.now()
         self.save(update_fields=["last_crosspost_error", "last_crosspost_error_at"])
 
+    def save_bluesky_session(self, session: str) -> None:
+        self.bluesky_session = session
+        self.save(update_fields=["bluesky_session"])
+
+    def forget_bluesky_session(self, session: str) -> None:
+        """Clear the stored Bluesky session, unless it is no longer ``session``
+        (another post has saved a newer one since)."""
+        stored = Profile.objects.filter(pk=self.pk).values_list("bluesky_session", flat=True).first()
+        if stored == session:
+            self.save_bluesky_session("")
+
+    def save_status_cafe_session(self, session: str) -> None:
+        self.status_cafe_session = session
+        self.save(update_fields=["status_cafe_session"])
+
     def clear_crosspost_error(self) -> None:
         self.last_crosspost_error = ""
         self.last_crosspost_error_at = None
@@ -1,9 +1,10 @@
 from __future__ import annotations
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from .models import Profile
+from .usernames import forget_username
 
 User = get_user_model()
 
@@ -11,3 +12,20 @@ User = get_user_model()
 def create_profile_for_new_user(sender, instance: User, created: bool, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def forget_cached_username_answers(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    # Logins save last_login only; they don't change which names are taken.
+    if update_fields is not None and "username" not in update_fields:
+        return
+    if created:
+        forget_username(instance.username)
+    else:
+        # Possibly a rename: the old name (unknown here) became free.
+        forget_username()
+
+
+@receiver(post_delete, sender=User)
+def forget_cached_username_answers_on_delete(sender, instance: User, **kwargs):
+    forget_username(instance.username)
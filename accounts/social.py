@@ -1,7 +1,13 @@
 from __future__ import annotations
+import json
 import re
-import threading
-from typing import Tuple, Optional, List
+from html.parser import HTMLParser
+from typing import Tuple, List
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from aether_notes.writer import run_write
 
 from .models import Profile
 
@@ -12,6 +18,9 @@ BLUESKY_LIMIT = 300
 
 URL_RE = re.compile(r"https?://[\w\-._~%:/?#@!$&'()*+,;=]+", re.IGNORECASE)
 STATUS_CAFE_LIMIT = 140
+STATUS_CAFE_URL = "https://status.cafe"
+STATUS_CAFE_DOMAIN = "status.cafe"
+STATUS_CAFE_CSRF_FIELD = "gorilla.csrf.Token"
 
 
 def _truncate(text: str, limit: int) -> str:
@@ -30,7 +39,11 @@ def post_mastodon(profile: Profile, text: str) -> Tuple[bool, str | None, str |
     try:
         from mastodon import Mastodon  # type: ignore
 
-        api = Mastodon(api_base_url=inst, access_token=token)
+        api = Mastodon(
+            api_base_url=inst,
+            access_token=token,
+            request_timeout=settings.CROSSPOST_TIMEOUT_SECONDS["mastodon"],
+        )
         limit = int(
             getattr(profile, "mastodon_char_limit", MASTODON_FALLBACK_LIMIT)
             or MASTODON_FALLBACK_LIMIT
@@ -100,14 +113,53 @@ def _build_bluesky_facets_manual(text: str):
 ## Link preview & thumbnail helpers removed as per request (keep code minimal)
 
 
+def _bluesky_auth_error(error: Exception) -> bool:
+    """Whether an atproto error means the session's tokens are no longer accepted."""
+    from atproto_client.exceptions import BadRequestError, UnauthorizedError  # type: ignore
+
+    if isinstance(error, UnauthorizedError):
+        return True
+    if isinstance(error, BadRequestError):
+        return getattr(getattr(error.response, "content", None), "error", None) in ("ExpiredToken", "InvalidToken")
+    return False
+
+
+def bluesky_client(profile: Profile):
+    """An atproto client signed in as the profile's Bluesky account.
+
+    Resumes the session stored on the profile when there is one; the client
+    refreshes its access token as it expires. Logs in with the app password
+    only when there is no stored session or it can no longer be refreshed.
+    Any new or refreshed session is saved back to the profile.
+    """
+    from atproto import Client, Request, SessionEvent  # type: ignore
+
+    client = Client(request=Request(timeout=settings.CROSSPOST_TIMEOUT_SECONDS["bluesky"]))
+
+    def save_session(event, session):
+        if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+            run_write(profile.save_bluesky_session, client.export_session_string())
+
+    client.on_session_change(save_session)
+    if profile.bluesky_session:
+        try:
+            client.login(session_string=profile.bluesky_session)
+            return client
+        except Exception as e:  # noqa: BLE001
+            # Refresh token expired or revoked; anything else (a timeout, a 5xx)
+            # fails the post and keeps the session for the retry.
+            if not _bluesky_auth_error(e):
+                raise
+    client.login(profile.bluesky_handle, profile.bluesky_app_password)
+    return client
+
+
 def post_bluesky(profile: Profile, text: str) -> Tuple[bool, str | None, str | None]:
     handle = profile.bluesky_handle or ""
     app_pw = profile.bluesky_app_password or ""
     if not handle or not app_pw or not profile.crosspost_bluesky:
         return False, "disabled_or_missing", None
     try:
-        from atproto import Client  # type: ignore
-
         # Truncate first to avoid slicing after facet indices prepared.
         truncated = _truncate(text, BLUESKY_LIMIT)
 
@@ -126,8 +178,7 @@ def post_bluesky(profile: Profile, text: str) -> Tuple[bool, str | None, str | N
                 if first_url:
                     break
 
-        client = Client()
-        client.login(handle, app_pw)
+        client = bluesky_client(profile)
         # send_post supports facets & embed when provided
         kwargs = {"text": processed_text}
         if facets:
@@ -142,18 +193,162 @@ def post_bluesky(profile: Profile, text: str) -> Tuple[bool, str | None, str | N
             remote_url = f"https://bsky.app/profile/{handle}/post/{rkey}" if rkey else None
         return True, uri, remote_url
     except Exception as e:  # noqa: BLE001
+        if profile.bluesky_session and _bluesky_auth_error(e):
+            # Revoked server-side: the retry logs in afresh. profile.bluesky_session
+            # is the session this call used (refreshes update it).
+            run_write(profile.forget_bluesky_session, profile.bluesky_session)
         profile.record_crosspost_error(f"Bluesky post failed: {e.__class__.__name__}")
         return False, None, None
 
 
+class _CsrfTokenParser(HTMLParser):
+    """Collects the gorilla CSRF token of each form on a page, keyed by the form's action."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens: dict[str | None, str] = {}
+        self._action: str | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "form":
+            self._action = dict(attrs).get("action")
+        elif tag == "input":
+            attrs = dict(attrs)
+            if attrs.get("name") == STATUS_CAFE_CSRF_FIELD and attrs.get("value"):
+                self.tokens.setdefault(self._action, attrs["value"])
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._action = None
+
+
+def find_csrf_token(html: str, action: str | None = None) -> str | None:
+    """The CSRF token of the form posting to ``action`` (of any form when None)."""
+    parser = _CsrfTokenParser()
+    parser.feed(html)
+    parser.close()
+    if action is None:
+        return next(iter(parser.tokens.values()), None)
+    return parser.tokens.get(action)
+
+
+def _status_cafe_client():
+    import httpx
+
+    return httpx.Client(
+        base_url=STATUS_CAFE_URL,
+        headers={"User-Agent": "AetherCrossposter/0.1 (+https://aether.meadow.cafe)"},
+        timeout=settings.CROSSPOST_TIMEOUT_SECONDS["status_cafe"],
+        follow_redirects=True,
+    )
+
+
+def _signed_out(response) -> bool:
+    # Pages that need a session redirect to /login.
+    if response.is_redirect:
+        return "login" in response.headers.get("location", "").lower()
+    return "login" in response.url.path.lower()
+
+
+def _submit_status(client, token: str, data: dict):
+    # Not following the redirect back to the home page saves a request.
+    return client.post("/add", data={STATUS_CAFE_CSRF_FIELD: token, **data}, follow_redirects=False)
+
+
+def _submitted(response) -> bool:
+    # A posted status redirects back to the home page; anything else (the
+    # login page, an error page, a form re-rendered with 200) is a failure.
+    if not response.is_redirect:
+        return False
+    location = urlsplit(response.headers.get("location", ""))
+    return location.netloc in ("", STATUS_CAFE_DOMAIN) and location.path == "/"
+
+
+def _load_status_cafe_session(profile: Profile, client) -> str | None:
+    """Put the stored cookies into ``client``; returns the stored post-form token."""
+    try:
+        session = json.loads(profile.status_cafe_session or "{}")
+    except ValueError:
+        return None
+    for name, value in session.get("cookies", {}).items():
+        client.cookies.set(name, value, domain=STATUS_CAFE_DOMAIN)
+    return session.get("token")
+
+
+def _save_status_cafe_session(profile: Profile, client, token: str) -> None:
+    cookies = {cookie.name: cookie.value for cookie in client.cookies.jar}
+    session = json.dumps({"cookies": cookies, "token": token}, sort_keys=True)
+    if session != profile.status_cafe_session:
+        run_write(profile.save_status_cafe_session, session)
+
+
+def _status_cafe_home_token(client) -> str | None:
+    """The post form's token from the home page, or None when not signed in."""
+    r = client.get("/", follow_redirects=False)
+    if r.status_code != 200:
+        return None
+    return find_csrf_token(r.text, "/add")
+
+
+def _status_cafe_sign_in(profile: Profile, client) -> tuple[str | None, str | None]:
+    """Log in with the profile's credentials.
+
+    Returns ``(post form token, None)``, or ``(None, error code)`` after
+    recording the error on the profile.
+    """
+    r = client.get("/login")
+    if r.status_code != 200:
+        profile.record_crosspost_error(f"Status.cafe login_get {r.status_code}")
+        return None, "login_get"
+    csrf_login = find_csrf_token(r.text)
+    if not csrf_login:
+        profile.record_crosspost_error("Status.cafe token_missing")
+        return None, "token_missing"
+
+    r = client.post(
+        "/check-login",
+        data={
+            STATUS_CAFE_CSRF_FIELD: csrf_login,
+            "name": profile.status_cafe_username,
+            "password": profile.status_cafe_password,
+        },
+    )
+    # Signed in if we land on a page with the post form (normally the home page).
+    token = None
+    if not _signed_out(r):
+        token = find_csrf_token(r.text, "/add") or _status_cafe_home_token(client)
+    if not token:
+        profile.record_crosspost_error("Status.cafe auth_failed")
+        return None, "auth_failed"
+    return token, None
+
+
+def check_status_cafe(profile: Profile) -> str | None:
+    """Make sure we can post as the profile, reusing its stored session if still valid.
+
+    Returns None when signed in, else the error code (also recorded on the profile).
+    """
+    with _status_cafe_client() as client:
+        token = None
+        if _load_status_cafe_session(profile, client):
+            token = _status_cafe_home_token(client)
+        if not token:
+            client.cookies.clear()
+            token, error = _status_cafe_sign_in(profile, client)
+            if not token:
+                return error
+        _save_status_cafe_session(profile, client, token)
+    return None
+
+
 def post_status_cafe(profile: Profile, text: str, face: str | None = None) -> bool:
-    """Programmatic login + status submit to status.cafe.
+    """Submit a status to status.cafe.
 
-    Since there is no public API we mimic browser form posts:
-      1. GET /login -> parse CSRF token (gorilla.csrf.Token)
-      2. POST /check-login with name+password+token (follow redirects)
-      3. GET / (home) to obtain posting form CSRF token
-      4. POST /add with face (emoji) + content + gorilla.csrf.Token
+    Since there is no public API we mimic the browser's form posts. The signed-in
+    cookies and the post form's CSRF token are kept (encrypted) on the profile,
+    so usually this is a single POST /add. When the session has expired we log
+    in again: GET /login for its token, POST /check-login (which lands on the
+    home page with the post form's token), then POST /add.
 
     Returns (ok).
     """
@@ -162,165 +357,45 @@ def post_status_cafe(profile: Profile, text: str, face: str | None = None) -> bo
     if not username or not password or not profile.crosspost_status_cafe:
         return False
 
-    try:
-        import httpx
-        from bs4 import BeautifulSoup  # type: ignore
-
-        # Shared client with cookie persistence
-        headers = {"User-Agent": "AetherCrossposter/0.1 (+https://aether.meadow.cafe)"}
-        with httpx.Client(
-            base_url="https://status.cafe",
-            headers=headers,
-            timeout=15,
-            follow_redirects=True,
-        ) as client:
-            # Step 1: fetch login page
-            r = client.get("/login")
-            if r.status_code != 200:
-                profile.record_crosspost_error(f"Status.cafe login_get {r.status_code}")
-                return False
-
-            soup = BeautifulSoup(r.text, "html.parser")
-            token_input = soup.find("input", {"name": "gorilla.csrf.Token"})  # type: ignore[assignment]
-            # Use getattr to satisfy type checkers (BeautifulSoup dynamic attrs)
-            if not token_input or not getattr(token_input, "get", lambda _x: None)("value"):
-                profile.record_crosspost_error("Status.cafe token_missing")
-                return False
-            csrf_login = getattr(token_input, "get", lambda _x: None)("value")  # type: ignore[call-arg]
-
-            # Step 2: post credentials
-            client.post(
-                "/check-login",
-                data={
-                    "gorilla.csrf.Token": csrf_login,
-                    "name": username,
-                    "password": password,
-                },
-            )
-
-            # Verify authenticated session by requesting /settings (will redirect to /login if not signed in)
-            rs = client.get("/settings")
-            if "login" in rs.url.path.lower():
-                profile.record_crosspost_error("Status.cafe auth_failed")
-                return False
+    chosen_face = (face or "").strip()
+    if chosen_face and len(chosen_face) > 8:
+        chosen_face = chosen_face[:8]
+    data = {
+        "face": chosen_face or "🙂",  # default emoji if unset
+        "content": _truncate(text, STATUS_CAFE_LIMIT),
+    }
 
-            # Step 3: fetch homepage for post form
-            r3 = client.get("/")
-            if r3.status_code != 200:
-                profile.record_crosspost_error(f"Status.cafe home_get {r3.status_code}")
-                return False
-
-            soup_home = BeautifulSoup(r3.text, "html.parser")
-            token_post_input = soup_home.find("form", {"action": "/add"})  # type: ignore[assignment]
-            if not token_post_input:
-                profile.record_crosspost_error("Status.cafe post_form_missing")
-                return False
-            hidden_csrf = token_post_input.find("input", {"name": "gorilla.csrf.Token"})  # type: ignore[assignment]
-            if not hidden_csrf or not getattr(hidden_csrf, "get", lambda _x: None)("value"):
-                profile.record_crosspost_error("Status.cafe post_token_missing")
-                return False
-            csrf_post = getattr(hidden_csrf, "get", lambda _x: None)("value")  # type: ignore[call-arg]
-
-            chosen_face = (face or "").strip()
-            if chosen_face and len(chosen_face) > 8:
-                chosen_face = chosen_face[:8]
-            content = _truncate(text, STATUS_CAFE_LIMIT)
-            r4 = client.post(
-                "/add",
-                data={
-                    "gorilla.csrf.Token": csrf_post,
-                    "face": chosen_face or "🙂",  # default emoji if unset
-                    "content": content,
-                },
-            )
-
-            if r4.status_code not in (200, 302):
-                profile.record_crosspost_error(
-                    f"Status.cafe post_fail {r4.status_code}"
-                )
+    try:
+        with _status_cafe_client() as client:
+            token = _load_status_cafe_session(profile, client)
+            if token:
+                r = _submit_status(client, token, data)
+                if _submitted(r):
+                    _save_status_cafe_session(profile, client, token)
+                    return True
+                if _signed_out(r):
+                    token = None
+                elif r.status_code == 403:
+                    # Still signed in, but the token no longer matches the CSRF cookie.
+                    token = _status_cafe_home_token(client)
+                else:
+                    profile.record_crosspost_error(f"Status.cafe post_fail {r.status_code}")
+                    return False
+
+            if not token:
+                client.cookies.clear()
+                token, _ = _status_cafe_sign_in(profile, client)
+                if not token:
+                    return False
+
+            r = _submit_status(client, token, data)
+            if not _submitted(r):
+                profile.record_crosspost_error(f"Status.cafe post_fail {r.status_code}")
                 return False
 
+            _save_status_cafe_session(profile, client, token)
             return True
 
     except Exception as e:  # noqa: BLE001
         profile.record_crosspost_error(f"Status.cafe exception: {e.__class__.__name__}")
         return False
-
-
-def _post_selected_networks(
-    profile: Profile,
-    text: str,
-    *,
-    want_masto: bool,
-    want_bluesky: bool,
-    want_status_cafe: bool,
-    status_cafe_face: Optional[str] = None,
-    note=None,
-) -> None:
-    """Internal worker that respects per-note selections combined with profile global toggles.
-
-    Any errors are recorded on the profile via the existing helpers.
-    """
-    any_error = False
-
-    if want_masto and profile.crosspost_mastodon:
-        ok, remote_id, remote_url = post_mastodon(profile, text)
-        any_error = any_error or (not ok)
-        if ok and note is not None:
-            try:
-                from aether_notes.models import NoteCrosspost  # type: ignore
-                cp, created = NoteCrosspost.objects.get_or_create(note=note, network="mastodon")
-                if created:
-                    cp.mark_success(remote_id=remote_id, remote_url=remote_url)
-            except Exception:  # pragma: no cover
-                pass
-
-    if want_bluesky and profile.crosspost_bluesky:
-        ok, remote_id, remote_url = post_bluesky(profile, text)
-        any_error = any_error or (not ok)
-        if ok and note is not None:
-            try:
-                from aether_notes.models import NoteCrosspost  # type: ignore
-                cp, created = NoteCrosspost.objects.get_or_create(note=note, network="bluesky")
-                if created:
-                    cp.mark_success(remote_id=remote_id, remote_url=remote_url)
-            except Exception:  # pragma: no cover
-                pass
-
-    if want_status_cafe and getattr(profile, "crosspost_status_cafe", False):
-        ok = post_status_cafe(profile, text, face=status_cafe_face)
-        any_error = any_error or (not ok)
-
-    if not any_error and (
-        profile.last_crosspost_error or profile.last_crosspost_error_at
-    ):
-        profile.clear_crosspost_error()
-
-
-def post_selected_networks_async(
-    profile: Profile,
-    text: str,
-    *,
-    want_masto: bool,
-    want_bluesky: bool,
-    want_status_cafe: bool,
-    status_cafe_face: Optional[str] = None,
-    note=None,
-) -> None:
-    """Fire-and-forget thread that posts only to networks the user selected on this note.
-
-    Combines per-note selections with global profile toggles so a disabled global setting never posts.
-    """
-    threading.Thread(
-        target=_post_selected_networks,
-        kwargs=dict(
-            profile=profile,
-            text=text,
-            want_masto=want_masto,
-            want_bluesky=want_bluesky,
-            want_status_cafe=want_status_cafe,
-            status_cafe_face=status_cafe_face,
-            note=note,
-        ),
-        daemon=True,
-    ).start()
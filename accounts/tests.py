@@ -0,0 +1,438 @@
+import json
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+import httpx
+from atproto import SessionEvent
+from atproto_client.exceptions import BadRequestError, InvokeTimeoutError, UnauthorizedError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from aether_notes.feed_cache import feed_queryset
+from aether_notes.models import Note, NoteCrosspost
+
+from .crosspost import CrosspostPool, claim, enqueue_crossposts, process
+from .models import Profile
+from .social import STATUS_CAFE_URL, _submitted, find_csrf_token, post_bluesky, post_status_cafe
+from .usernames import find_user, forget_username, is_username_taken, username_matches
+
+User = get_user_model()
+
+
+@override_settings(FEED_PAGE_SIZE=2)
+class ArchivePaginationTests(TestCase):
+    """A public archive pages through the owner's published notes only."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.user.profile.show_archive = True
+        self.user.profile.save()
+        now = timezone.now()
+        for i in range(3):
+            Note.objects.create(text=f"mine-{i}", pub_date=now, user=self.user)
+        Note.objects.create(text="my draft", pub_date=now, user=self.user, is_draft=True)
+        Note.objects.create(text="not mine", pub_date=now, user=User.objects.create(username="other"))
+
+    def test_pages_hold_only_published_notes_of_the_owner(self):
+        response = self.client.get(reverse("accounts:user_archive", args=["writer"]))
+        html = response.content.decode()
+        cursor = response.context["next_cursor"]
+        self.assertIsNotNone(cursor)
+        data = self.client.get(reverse("accounts:user_archive_page", args=["writer"]), {"cursor": cursor}).json()
+        self.assertIsNone(data["next"])
+        html += data["html"]
+        for i in range(3):
+            self.assertEqual(html.count(f"mine-{i}"), 1)
+        self.assertNotIn("my draft", html)
+        self.assertNotIn("not mine", html)
+
+    def test_bad_cursor_and_hidden_archive(self):
+        url = reverse("accounts:user_archive_page", args=["writer"])
+        response = self.client.get(url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_cursor")
+        self.user.profile.show_archive = False
+        self.user.profile.save()
+        self.assertEqual(self.client.get(url, {"cursor": "1.1"}).status_code, 404)
+
+
+class ArchiveConditionalGetTests(TestCase):
+    """Deleting an older note leaves the newest timestamp alone; the ETag must still change."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.user.profile.show_archive = True
+        self.user.profile.save()
+        self.older = Note.objects.create(text="deleted note", pub_date=timezone.now(), user=self.user)
+        Note.objects.create(text="kept note", pub_date=timezone.now(), user=self.user)
+        self.url = reverse("accounts:user_archive", args=["writer"])
+
+    def test_etag_revalidates_after_a_delete(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, headers={"if-none-match": etag}).status_code, 304)
+        self.older.delete()
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "deleted note")
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        self.assertNotIn("Last-Modified", self.client.get(self.url))
+        self.older.delete()
+        self.assertEqual(self.client.get(self.url, headers={"if-modified-since": http_date()}).status_code, 200)
+
+
+class UsernameLookupTests(TestCase):
+    """Case-insensitive username lookups use the LOWER(username) index and a signal-invalidated cache."""
+
+    def setUp(self):
+        forget_username()
+        self.addCleanup(forget_username)
+
+    def test_lookup_uses_the_lower_index(self):
+        plan = User.objects.filter(username_matches("Alice")).explain()
+        self.assertIn("USING INDEX auth_user_username_lower_idx", plan)
+        self.assertNotRegex(plan, r"\bSCAN auth_user\b")
+
+    def test_find_user_ignores_case(self):
+        user = User.objects.create(username="Alice")
+        self.assertEqual(find_user("aLICE"), user)
+        self.assertIsNone(find_user("alicia"))
+
+    def test_cached_answers_follow_creates_and_renames(self):
+        self.assertFalse(is_username_taken("Alice"))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_username_taken("alice "))
+
+        user = User.objects.create(username="alice")
+        self.assertTrue(is_username_taken("ALICE"))
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])  # a login keeps the cache
+        with self.assertNumQueries(0):
+            self.assertTrue(is_username_taken("Alice"))
+
+        user.username = "bob"
+        user.save()
+        self.assertFalse(is_username_taken("alice"))
+        self.assertTrue(is_username_taken("Bob"))
+
+
+@override_settings(CROSSPOST_WORKERS=0, CROSSPOST_MAX_ATTEMPTS=2)
+class CrosspostQueueTests(TestCase):
+    """Publishing queues crossposts as rows; workers post them and retry failures."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="poster")
+        profile = self.user.profile
+        profile.crosspost_mastodon = True
+        profile.mastodon_instance = "https://example.social"
+        profile.mastodon_token = "token"
+        profile.save()
+        self.note = Note.objects.create(text="hello elsewhere", pub_date=timezone.now(), user=self.user)
+
+    def _enqueue(self):
+        return enqueue_crossposts(
+            self.note, self.user.profile, want_masto=True, want_bluesky=True, want_status_cafe=False
+        )
+
+    def test_only_selected_and_enabled_networks_are_queued(self):
+        self.assertEqual(self._enqueue(), ["mastodon"])
+        self.assertEqual(self._enqueue(), ["mastodon"])  # queuing again is a no-op
+        crosspost = NoteCrosspost.objects.get(note=self.note)
+        self.assertEqual(crosspost.status, NoteCrosspost.PENDING)
+
+    @patch("accounts.crosspost.post_mastodon", return_value=(True, "1", "https://example.social/@poster/1"))
+    def test_success_is_recorded_and_linked(self, post):
+        self._enqueue()
+        self.assertFalse(feed_queryset().get(pk=self.note.pk).crossposts.all())
+
+        crosspost = claim("mastodon")
+        self.assertIsNone(claim("mastodon"))  # leased while in flight
+        self.assertTrue(process(crosspost))
+        crosspost.refresh_from_db()
+        self.assertEqual((crosspost.status, crosspost.attempts), (NoteCrosspost.SUCCESS, 1))
+        self.assertEqual(len(feed_queryset().get(pk=self.note.pk).crossposts.all()), 1)
+
+    @patch("accounts.crosspost.post_mastodon", return_value=(False, None, None))
+    def test_failures_back_off_then_give_up(self, post):
+        self._enqueue()
+        self.assertFalse(process(claim("mastodon")))
+        crosspost = NoteCrosspost.objects.get(note=self.note)
+        self.assertEqual(crosspost.status, NoteCrosspost.PENDING)
+        self.assertGreater(crosspost.next_attempt_at, timezone.now())
+        self.assertIsNone(claim("mastodon"))
+
+        NoteCrosspost.objects.filter(pk=crosspost.pk).update(next_attempt_at=timezone.now())
+        self.assertFalse(process(claim("mastodon")))
+        crosspost.refresh_from_db()
+        self.assertEqual((crosspost.status, crosspost.attempts), (NoteCrosspost.ERROR, 2))
+        self.assertIsNone(crosspost.next_attempt_at)
+
+
+@override_settings(CROSSPOST_WORKERS=0)
+class CrosspostFanOutTests(TransactionTestCase):
+    """A worker posts all of a note's due networks at once (posting threads need committed rows)."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="fanout")
+        profile = self.user.profile
+        profile.crosspost_mastodon = True
+        profile.mastodon_instance = "https://example.social"
+        profile.mastodon_token = "token"
+        profile.crosspost_status_cafe = True
+        profile.status_cafe_username = "fanout"
+        profile.status_cafe_password = "secret"
+        profile.save()
+        self.note = Note.objects.create(text="everywhere at once", pub_date=timezone.now(), user=self.user)
+        enqueue_crossposts(self.note, profile, want_masto=True, want_bluesky=False, want_status_cafe=True)
+        self.pool = CrosspostPool()
+        self.pool.start(0)  # slots and posting executor, no worker threads
+        self.addCleanup(self.pool.stop)
+
+    @patch("accounts.crosspost.post_status_cafe", return_value=True)
+    @patch("accounts.crosspost.post_mastodon", return_value=(True, "1", "https://example.social/@fanout/1"))
+    def test_run_once_posts_every_network_of_the_note(self, post_mastodon, post_status_cafe):
+        self.assertTrue(self.pool.run_once())
+        post_mastodon.assert_called_once()
+        post_status_cafe.assert_called_once()
+        self.assertEqual(
+            dict(NoteCrosspost.objects.filter(note=self.note).values_list("network", "status")),
+            {"mastodon": NoteCrosspost.SUCCESS, "status_cafe": NoteCrosspost.SUCCESS},
+        )
+        for network, slot in self.pool._slots.items():
+            self.assertEqual(slot._value, settings.CROSSPOST_NETWORK_CONCURRENCY[network], network)
+        self.assertFalse(self.pool.run_once())
+
+    def test_fan_out_after_stop_releases_slots(self):
+        jobs = self.pool._claim("mastodon")
+        jobs += self.pool._claim_siblings(jobs[0][0])
+        self.assertEqual(len(jobs), 2)
+        self.pool.stop()
+        self.pool._fan_out(jobs)
+        for network, slot in self.pool._slots.items():
+            self.assertEqual(slot._value, settings.CROSSPOST_NETWORK_CONCURRENCY[network], network)
+        # Still leased: retried once the lease runs out.
+        self.assertFalse(NoteCrosspost.objects.filter(note=self.note, status=NoteCrosspost.SUCCESS).exists())
+
+
+class StatusCafeTokenTests(TestCase):
+    def test_token_of_the_post_form(self):
+        html = (
+            '<form action="/logout"><input name="gorilla.csrf.Token" value="logout"></form>'
+            '<form method=post action="/add"><input type=hidden value="a&amp;b" name="gorilla.csrf.Token">'
+            "<textarea name=content></textarea></form>"
+        )
+        self.assertEqual(find_csrf_token(html, "/add"), "a&b")
+        self.assertEqual(find_csrf_token(html), "logout")
+        self.assertIsNone(find_csrf_token("<form action='/add'></form>", "/add"))
+
+
+class FakeStatusCafe:
+    """Just enough of status.cafe's forms for an httpx.MockTransport."""
+
+    def __init__(self, *, sessions=("old",), token="post-token", password="secret"):
+        self.sessions = set(sessions)
+        self.token = token
+        self.password = password
+        self.requests = []
+        self.posted = []
+
+    def __call__(self, request):
+        path = request.url.path
+        self.requests.append(f"{request.method} {path}")
+        cookies = SimpleCookie(request.headers.get("cookie", ""))
+        signed_in = "session" in cookies and cookies["session"].value in self.sessions
+        form = {name: values[0] for name, values in parse_qs(request.content.decode()).items()}
+        if path == "/login":
+            return httpx.Response(200, html='<form action="/check-login"><input name="gorilla.csrf.Token" value="login-token"></form>')
+        if path == "/check-login":
+            if form.get("password") != self.password:
+                return httpx.Response(303, headers={"location": "/login"})
+            self.sessions.add("new")
+            return httpx.Response(303, headers={"location": "/", "set-cookie": "session=new; Path=/"})
+        if not signed_in:
+            return httpx.Response(303, headers={"location": "/login"})
+        if path == "/":
+            return httpx.Response(200, html=f'<form action="/add"><input name="gorilla.csrf.Token" value="{self.token}"></form>')
+        if path == "/add":
+            if form.get("gorilla.csrf.Token") != self.token:
+                return httpx.Response(403)
+            self.posted.append(form["content"])
+            return httpx.Response(303, headers={"location": "/"})
+        return httpx.Response(404)
+
+
+class StatusCafeSessionTests(TestCase):
+    """post_status_cafe reuses the stored session and only logs in when it has to."""
+
+    def setUp(self):
+        self.profile = User.objects.create(username="cafe").profile
+        self.profile.crosspost_status_cafe = True
+        self.profile.status_cafe_username = "cafe"
+        self.profile.status_cafe_password = "secret"
+        self.profile.status_cafe_session = json.dumps({"cookies": {"session": "old"}, "token": "post-token"})
+        self.profile.save()
+
+    def _post(self, server):
+        def client():
+            return httpx.Client(
+                base_url=STATUS_CAFE_URL, transport=httpx.MockTransport(server), follow_redirects=True
+            )
+
+        with patch("accounts.social._status_cafe_client", client):
+            return post_status_cafe(self.profile, "hello cafe")
+
+    def _stored_session(self):
+        self.profile.refresh_from_db()
+        return json.loads(self.profile.status_cafe_session)
+
+    def test_stored_session_is_reused(self):
+        server = FakeStatusCafe()
+        self.assertTrue(self._post(server))
+        self.assertEqual(server.requests, ["POST /add"])
+        self.assertEqual(server.posted, ["hello cafe"])
+
+    def test_rejected_token_is_refetched_from_the_home_page(self):
+        server = FakeStatusCafe(token="rotated")
+        self.assertTrue(self._post(server))
+        self.assertEqual(server.requests, ["POST /add", "GET /", "POST /add"])
+        self.assertEqual(self._stored_session()["token"], "rotated")
+
+    def test_expired_session_logs_in_again_and_is_saved(self):
+        server = FakeStatusCafe(sessions=())
+        self.assertTrue(self._post(server))
+        self.assertEqual(
+            server.requests, ["POST /add", "GET /login", "POST /check-login", "GET /", "POST /add"]
+        )
+        self.assertEqual(self._stored_session(), {"cookies": {"session": "new"}, "token": "post-token"})
+
+    def test_failed_login(self):
+        server = FakeStatusCafe(sessions=(), password="changed")
+        self.assertFalse(self._post(server))
+        self.assertEqual(server.posted, [])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.last_crosspost_error, "Status.cafe auth_failed")
+        self.assertEqual(self._stored_session()["cookies"], {"session": "old"})  # left as it was
+
+    def test_only_a_redirect_home_counts_as_posted(self):
+        self.assertTrue(_submitted(httpx.Response(303, headers={"location": "/"})))
+        self.assertTrue(_submitted(httpx.Response(302, headers={"location": "https://status.cafe/"})))
+        for response in (
+            httpx.Response(303, headers={"location": "/login"}),
+            httpx.Response(303, headers={"location": "/error?msg=too+long"}),
+            httpx.Response(302, headers={"location": "https://elsewhere.example/"}),
+            httpx.Response(200),
+        ):
+            self.assertFalse(_submitted(response), response.headers.get("location"))
+
+
+class FakeBlueskyClient:
+    """Stands in for atproto.Client: resuming "stale" refreshes it to "refreshed"."""
+
+    def __init__(self, *, resume_error=None, post_error=None, before_post=None):
+        self.resume_error = resume_error
+        self.post_error = post_error
+        self.before_post = before_post
+        self.logins = []
+        self.session = None
+        self._callbacks = []
+
+    def on_session_change(self, callback):
+        self._callbacks.append(callback)
+
+    def export_session_string(self):
+        return self.session
+
+    def _change(self, event, session):
+        self.session = session
+        for callback in self._callbacks:
+            callback(event, session)
+
+    def login(self, login=None, password=None, session_string=None):
+        if session_string is None:
+            self.logins.append("password")
+            self._change(SessionEvent.CREATE, "created")
+            return
+        self.logins.append("resume")
+        if self.resume_error is not None:
+            raise self.resume_error
+        self.session = session_string
+        if session_string == "stale":
+            self._change(SessionEvent.REFRESH, "refreshed")
+
+    def send_post(self, text, facets=None):
+        if self.before_post is not None:
+            self.before_post()
+        if self.post_error is not None:
+            raise self.post_error
+        return SimpleNamespace(uri="at://did:plc:test/app.bsky.feed.post/abc")
+
+
+class BlueskySessionTests(TestCase):
+    """post_bluesky resumes the stored session and only drops it when Bluesky rejects it."""
+
+    def setUp(self):
+        self.profile = User.objects.create(username="sky").profile
+        self.profile.crosspost_bluesky = True
+        self.profile.bluesky_handle = "sky.example"
+        self.profile.bluesky_app_password = "app-password"
+        self.profile.bluesky_session = "stored"
+        self.profile.save()
+
+    def _post(self, client):
+        with patch("atproto.Client", lambda request=None: client):
+            return post_bluesky(self.profile, "hello sky")
+
+    def _stored_session(self):
+        return Profile.objects.get(pk=self.profile.pk).bluesky_session
+
+    @staticmethod
+    def _expired():
+        return BadRequestError(SimpleNamespace(content=SimpleNamespace(error="ExpiredToken")))
+
+    def test_stored_session_is_resumed(self):
+        client = FakeBlueskyClient()
+        ok, uri, url = self._post(client)
+        self.assertTrue(ok)
+        self.assertEqual(url, "https://bsky.app/profile/sky.example/post/abc")
+        self.assertEqual(client.logins, ["resume"])
+        self.assertEqual(self._stored_session(), "stored")
+
+    def test_refreshed_session_is_saved(self):
+        self.profile.save_bluesky_session("stale")
+        client = FakeBlueskyClient()
+        self.assertTrue(self._post(client)[0])
+        self.assertEqual(client.logins, ["resume"])
+        self.assertEqual(self._stored_session(), "refreshed")
+
+    def test_expired_session_falls_back_to_password_login(self):
+        client = FakeBlueskyClient(resume_error=self._expired())
+        self.assertTrue(self._post(client)[0])
+        self.assertEqual(client.logins, ["resume", "password"])
+        self.assertEqual(self._stored_session(), "created")
+
+    def test_network_errors_keep_the_session(self):
+        self.assertFalse(self._post(FakeBlueskyClient(post_error=InvokeTimeoutError()))[0])
+        self.assertEqual(self._stored_session(), "stored")
+        client = FakeBlueskyClient(resume_error=InvokeTimeoutError())
+        self.assertFalse(self._post(client)[0])
+        self.assertEqual(client.logins, ["resume"])  # no password login on a timeout
+        self.assertEqual(self._stored_session(), "stored")
+
+    def test_rejected_session_is_cleared_unless_replaced(self):
+        self.assertFalse(self._post(FakeBlueskyClient(post_error=UnauthorizedError()))[0])
+        self.assertEqual(self._stored_session(), "")
+
+        self.profile.save_bluesky_session("stored")
+        elsewhere = Profile.objects.get(pk=self.profile.pk)
+        client = FakeBlueskyClient(
+            post_error=UnauthorizedError(), before_post=lambda: elsewhere.save_bluesky_session("newer")
+        )
+        self.assertFalse(self._post(client)[0])
+        self.assertEqual(self._stored_session(), "newer")
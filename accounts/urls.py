@@ -17,4 +17,5 @@ urlpatterns = [
     path("mastodon/callback/", views.mastodon_oauth_callback, name="mastodon_oauth_callback"),
     # Public archive/profile
     path("u/<str:username>/", views.user_archive, name="user_archive"),
+    path("u/<str:username>/notes/", views.user_archive_page, name="user_archive_page"),
 ]
@@ -0,0 +1,64 @@
+"""Case-insensitive username lookups.
+
+Lookups compare ``LOWER(username)`` against ``LOWER(<input>)`` so SQLite can
+answer them from the ``auth_user_username_lower_idx`` expression index (accounts
+migration 0006); ``username__iexact`` compiles to a LIKE that scans the table.
+
+``is_username_taken`` also keeps a small per-process cache of answers, since the
+registration form asks on every keystroke and every anonymous note asks about its
+author name. Taken names are cached until a user is renamed or deleted (see
+accounts.signals); free names only briefly, as another process may register one.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+
+_lock = threading.Lock()
+# lowercased name -> (taken, expires at)
+_answers: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+
+
+def username_matches(username: str) -> Exact:
+    """Filter expression: ``username`` equals ``username`` ignoring case."""
+    return Exact(Lower("username"), Lower(Value(username)))
+
+
+def find_user(username: str):
+    """The user whose name matches ``username`` ignoring case, or None."""
+    return get_user_model().objects.filter(username_matches(username)).order_by("pk").first()
+
+
+def is_username_taken(username: str) -> bool:
+    key = username.strip().lower()
+    now = time.monotonic()
+    with _lock:
+        answer = _answers.get(key)
+        if answer is not None and answer[1] > now:
+            _answers.move_to_end(key)
+            return answer[0]
+
+    taken = get_user_model().objects.filter(username_matches(username.strip())).exists()
+    ttl = settings.USERNAME_TAKEN_CACHE_SECONDS if taken else settings.USERNAME_FREE_CACHE_SECONDS
+    with _lock:
+        _answers[key] = (taken, now + ttl)
+        _answers.move_to_end(key)
+        while len(_answers) > settings.USERNAME_CACHE_SIZE:
+            _answers.popitem(last=False)
+    return taken
+
+
+def forget_username(username: str | None = None) -> None:
+    """Drop the cached answer for ``username``, or every answer if None."""
+    with _lock:
+        if username is None:
+            _answers.clear()
+        else:
+            _answers.pop(username.strip().lower(), None)
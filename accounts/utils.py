@@ -1,8 +1,10 @@
 from __future__ import annotations
+import hashlib
 import time
 from functools import wraps
 from typing import Callable, Any, Optional
 
+from django.conf import settings
 from django.core.cache import cache
 from django.http import HttpRequest, HttpResponse, JsonResponse
 
@@ -50,3 +52,22 @@ def remaining_requests(prefix: str, request: HttpRequest, limit: int, window_sec
     if not data:
         return limit
     return max(0, limit - int(data.get("count", 0)))
+
+def make_etag(*parts: Any) -> str:
+    """Compact strong ETag value from the cheap aggregates that describe a page."""
+    raw = ":".join(str(p) for p in parts)
+    return hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+def viewer_key(request: HttpRequest) -> str:
+    """Identify who a page is rendered for (header links, note form, owner controls).
+
+    Includes the CSRF cookie: pages embed a token derived from it, and it
+    rotates on login, so a revalidated page never carries a stale token.
+    """
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return f"anon.{csrf}"
+    profile = getattr(user, "profile", None)
+    updated = profile.updated_at.timestamp() if profile else ""
+    return f"{user.pk}.{user.username}.{updated}.{csrf}"
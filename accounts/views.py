@@ -5,20 +5,28 @@ import json
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.http import (
     HttpRequest,
     HttpResponse,
     JsonResponse,
     HttpResponseBadRequest,
 )
+from django.conf import settings
+from django.db.models import Count, Max, Sum
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 
 from .forms import RegistrationForm, ProfileForm
 from .models import Profile
-from .utils import rate_limited, client_ip
+from .social import bluesky_client, check_status_cafe
+from .usernames import find_user, is_username_taken
+from .utils import rate_limited, client_ip, make_etag, viewer_key
+from aether.routers import use_replica
 from aether_notes.models import Note
+from aether_notes.pagination import InvalidCursor, keyset_page
+from aether_notes.search import search_user_notes
 from django.utils.safestring import mark_safe
 
 User = get_user_model()
@@ -68,7 +76,7 @@ def check_username(request: HttpRequest) -> HttpResponse:
     username = (request.GET.get("u") or "").strip()
     available = False
     if username:
-        available = not User.objects.filter(username__iexact=username).exists()
+        available = not is_username_taken(username)
     return JsonResponse({"available": available})
 
 
@@ -114,10 +122,7 @@ def test_bluesky(request: HttpRequest) -> HttpResponse:
     if not handle or not app_pw:
         return JsonResponse({"ok": False, "error": "missing_credentials"})
     try:
-        from atproto import Client
-
-        client = Client()
-        client.login(handle, app_pw)
+        bluesky_client(profile)
         profile.clear_crosspost_error()
         return JsonResponse({"ok": True})
     except Exception as e:  # noqa: BLE001
@@ -136,38 +141,9 @@ def test_status_cafe(request: HttpRequest) -> HttpResponse:
         return JsonResponse({"ok": False, "error": "missing_credentials"})
 
     try:
-        import httpx
-        from bs4 import BeautifulSoup  # type: ignore
-
-        with httpx.Client(base_url="https://status.cafe", timeout=15, follow_redirects=True) as client:
-            r = client.get("/login")
-            if r.status_code != 200:
-                profile.record_crosspost_error(f"Status.cafe login_get {r.status_code}")
-                return JsonResponse({"ok": False, "error": "login_get"})
-
-            soup = BeautifulSoup(r.text, "html.parser")
-            token_input = soup.find("input", {"name": "gorilla.csrf.Token"})
-            token = token_input.get("value") if token_input else None
-
-            if not token:
-                profile.record_crosspost_error("Status.cafe token_missing")
-                return JsonResponse({"ok": False, "error": "token_missing"})
-
-            client.post(
-                "/check-login",
-                data={
-                    "gorilla.csrf.Token": token,
-                    "name": username,
-                    "password": password,
-                },
-            )
-
-            # Validate session by attempting /settings; redirect to /login indicates failure
-            rs = client.get("/settings")
-            if "login" in rs.url.path.lower():
-                profile.record_crosspost_error("Status.cafe auth_failed")
-                return JsonResponse({"ok": False, "error": "auth_failed"})
-
+        error = check_status_cafe(profile)
+        if error:
+            return JsonResponse({"ok": False, "error": error})
         profile.clear_crosspost_error()
         return JsonResponse({"ok": True})
 
@@ -313,23 +289,98 @@ def logout_view(request: HttpRequest) -> HttpResponse:
     return redirect("index")
 
 
+def _archive_user(username: str):
+    """Return the user whose public archive lives at ``username``, or None.
+
+    None if the user doesn't exist or hasn't enabled the archive.
+    """
+    user = find_user(username)
+    if user is None:
+        return None
+    if not hasattr(user, "profile") or not user.profile.show_archive:  # type: ignore[attr-defined]
+        return None
+    return user
+
+
+def _archive_notes(user):
+    return Note.objects.filter(user=user, is_draft=False).with_crossposts()
+
+
+def _archive_search_text(request: HttpRequest) -> str:
+    return (request.GET.get("q") or "").strip()[:200]
+
+
+def _archive_page(user, q: str, cursor: str | None) -> tuple[list[Note], str | None]:
+    """One page of the archive: newest first, or best matches first when searching.
+
+    Raises InvalidCursor for garbage cursors.
+    """
+    if not q:
+        return keyset_page(_archive_notes(user), cursor, settings.FEED_PAGE_SIZE)
+    ids, next_cursor = search_user_notes(user.pk, q, cursor, settings.FEED_PAGE_SIZE)
+    by_id = _archive_notes(user).in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id], next_cursor
+
+
+def _archive_state(request: HttpRequest, username: str) -> dict[str, Any] | None:
+    """Archive owner plus cheap aggregates over their notes, memoized per request.
+
+    Used for the archive's ETag; views/flags are included because counter
+    updates don't touch last_modified. There is no Last-Modified validator:
+    deleting a note can leave the newest timestamp unchanged.
+    """
+    if not hasattr(request, "_archive_state"):
+        user = _archive_user(username)
+        state = None
+        if user is not None:
+            state = Note.objects.filter(user=user, is_draft=False).aggregate(
+                latest=Max("last_modified"),
+                count=Count("pk"),
+                views=Sum("views"),
+                flags=Sum("flags"),
+            )
+            state["user"] = user
+        request._archive_state = state
+    return request._archive_state
+
+
+def _archive_etag(request: HttpRequest, username: str) -> str | None:
+    state = _archive_state(request, username)
+    if state is None:
+        return None
+    profile = state["user"].profile
+    return make_etag(
+        "archive",
+        state["user"].pk,
+        _archive_search_text(request),
+        profile.updated_at.timestamp(),
+        viewer_key(request),
+        state["count"],
+        state["latest"],
+        state["views"],
+        state["flags"],
+    )
+
+
+@use_replica
+@condition(etag_func=_archive_etag)
 def user_archive(request: HttpRequest, username: str) -> HttpResponse:
     """Public archive/profile page for a user if they opted in.
 
-    Shows all their notes (no 48h cutoff) newest first.
+    Shows all their notes (no 48h cutoff) newest first; the first page is
+    rendered here and the rest stream in from user_archive_page.
     404 if user not found or archive disabled.
     """
-    try:
-        user = User.objects.get(username__iexact=username)
-    except User.DoesNotExist:
+    state = _archive_state(request, username)
+    if state is None:
         return render(
             request, "404.html", status=404
         )  # fallback; custom template optional
-    if not hasattr(user, "profile") or not user.profile.show_archive:  # type: ignore[attr-defined]
-        return render(request, "404.html", status=404)
+    user = state["user"]
 
-    # Fetch latest 200 notes authored by this user (persist even if beyond feed window)
-    notes = Note.objects.filter(user=user, is_draft=False).order_by("-pub_date")[:200]
+    # Notes persist here even beyond the feed window
+    q = _archive_search_text(request)
+    notes, next_cursor = _archive_page(user, q, None)
     profile: Profile = user.profile  # type: ignore[attr-defined]
 
     # Markdown rendering (safe subset) for bio
@@ -374,6 +425,29 @@ def user_archive(request: HttpRequest, username: str) -> HttpResponse:
         "archive_user": user,
         "profile": profile,
         "notes": notes,
+        "next_cursor": next_cursor,
+        "q": q,
         "rendered_bio": rendered_bio,
     }
     return render(request, "accounts/archive.html", ctx)
+
+
+@use_replica
+def user_archive_page(request: HttpRequest, username: str) -> HttpResponse:
+    """Next page of a user's archive for infinite scroll.
+
+    Expects ?cursor=<next cursor of the previous page> (and ?q= when searching).
+    Returns JSON { ok, html, next } where next is null on the last page.
+    """
+    user = _archive_user(username)
+    if user is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    cursor = (request.GET.get("cursor") or "").strip()
+    if not cursor:
+        return JsonResponse({"ok": False, "error": "missing_cursor"}, status=400)
+    try:
+        notes, next_cursor = _archive_page(user, _archive_search_text(request), cursor)
+    except InvalidCursor:
+        return JsonResponse({"ok": False, "error": "invalid_cursor"}, status=400)
+    html = render_to_string("accounts/_archive_notes.html", {"notes": notes}, request=request)
+    return JsonResponse({"ok": True, "html": html, "next": next_cursor})
@@ -0,0 +1,72 @@
+"""Send the read-heavy note queries to the ``replica`` database alias.
+
+``replica`` is opened with ``PRAGMA query_only`` on the same SQLite file by
+default, or on a snapshot copy when DATABASE_REPLICA_PATH is set (see the
+``refresh_replica`` command). A snapshot can lag behind, so only reads that
+can tolerate that go there: Note and NoteCrosspost queries made by the feed
+and archive pages, which opt in with ``use_replica``. Everything else reads
+from ``default``. That includes sessions, users, OTP devices and profiles,
+plus any read that precedes a write (delete, crosspost claims) or happens
+inside a transaction.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+# Models whose reads may be served by the replica (app_label.model_name).
+REPLICA_MODELS = {"aether_notes.note", "aether_notes.notecrosspost"}
+# Apps that always read from the primary, even inside use_replica.
+PRIMARY_APPS = {"sessions", "auth", "accounts", "contenttypes", "admin"}
+
+_replica_reads: contextvars.ContextVar[bool] = contextvars.ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Allow REPLICA_MODELS reads in the block to use the replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_replica(view):
+    """View decorator: the view's note/feed reads may come from the replica."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        app_label = model._meta.app_label
+        if (
+            not _replica_reads.get()
+            or app_label in PRIMARY_APPS
+            or app_label.startswith("otp_")
+            or model._meta.label_lower not in REPLICA_MODELS
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -66,6 +66,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Server-Timing: time each request spent writing to the database
+    "aether_notes.middleware.write_timing_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -100,13 +102,65 @@ WSGI_APPLICATION = "aether.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Seconds a connection is kept across requests (per thread) and health-checked
+# before reuse. 0 closes it after each request, which is what ASGI needs (Django
+# advises against persistent connections there); `make serve` raises it for the
+# gthread WSGI workers, whose threads are long-lived.
+DATABASE_CONN_MAX_AGE = int(os.getenv("DATABASE_CONN_MAX_AGE", "0"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# SQLite connection settings (aether_notes.db_signals). The journal mode is
+# stored in the database file, so it is set once per process; the profile's
+# pragmas apply to every new connection. Compare profiles on a copy of the
+# data with `manage.py bench_sqlite_profiles`.
+SQLITE_JOURNAL_MODE = "wal"
+SQLITE_PRAGMA_PROFILES = {
+    # What every connection used to get.
+    "baseline": {
+        "busy_timeout": 5000,
+    },
+    "tuned": {
+        "busy_timeout": 5000,
+        # In WAL mode only a power loss (not an app crash) can lose the last
+        # commits; the file itself stays consistent.
+        "synchronous": "NORMAL",
+        "mmap_size": 128 * 1024 * 1024,
+        "cache_size": -16000,  # KiB, per connection
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,  # pages
+        "foreign_keys": "ON",
+    },
+}
+# "baseline" stays the default until a deployment has measured "tuned" on its
+# own data and hardware; set SQLITE_PRAGMA_PROFILE=tuned to switch.
+SQLITE_PRAGMA_PROFILE = os.getenv("SQLITE_PRAGMA_PROFILE", "baseline")
+
+# Opt-in: the feed and archive pages read notes through a separate query-only
+# connection (aether.routers), on the same file unless DATABASE_REPLICA_PATH
+# points at a snapshot kept fresh by `manage.py refresh_replica` (e.g. for a
+# second, read-only app node). Sessions, users and profiles always read from
+# the primary.
+DATABASE_READ_ROUTING = os.getenv("DATABASE_READ_ROUTING", "False") == "True"
+DATABASE_REPLICA_PATH = os.getenv("DATABASE_REPLICA_PATH", "")
+if DATABASE_READ_ROUTING:
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": DATABASE_REPLICA_PATH or DATABASES["default"]["NAME"],
+        "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"init_command": "PRAGMA query_only=1;"},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["aether.routers.ReadReplicaRouter"]
+
 # Simple local cache (can be replaced with Redis/Memcached in production)
 CACHES = {
     "default": {
@@ -115,6 +169,72 @@ CACHES = {
     }
 }
 
+# Rendered home feed fragment (see aether_notes.feed_cache). Invalidation is
+# version-based; the timeout only bounds how long notes that crossed the 48h
+# cutoff stay in the markup (the page script hides them as they expire).
+FEED_CACHE_SECONDS = int(os.getenv("FEED_CACHE_SECONDS", "300"))
+# The feed's cache version is this file's modification time, shared by every
+# process on the host (web workers, management commands, crosspost_worker).
+FEED_VERSION_FILE = os.getenv("FEED_VERSION_FILE", str(BASE_DIR / "feed.version"))
+# Runs the tests against a temporary FEED_VERSION_FILE.
+TEST_RUNNER = "aether.test_runner.TestRunner"
+# Notes per page on the home feed and archive pages (keyset-paginated; the rest
+# stream in as the reader scrolls).
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "30"))
+# Live feed over Server-Sent Events (aether_notes.live; needs the ASGI server).
+LIVE_HEARTBEAT_SECONDS = 20
+LIVE_RETRY_MS = 5000
+LIVE_QUEUE_SIZE = 100  # pending events per connection before dropping
+# Max note ids accepted per witness batch (the feed sends what scrolled into view).
+WITNESS_BATCH_MAX = 50
+# Recent (note, device) witness pairs remembered per process so repeat witnesses
+# skip the database (aether_notes.seen). Roughly 200 bytes per entry; 0 disables.
+WITNESS_SEEN_CACHE_SIZE = int(os.getenv("WITNESS_SEEN_CACHE_SIZE", "50000"))
+# Per-process cache of "is this username taken?" answers (accounts.usernames).
+USERNAME_CACHE_SIZE = 2000
+USERNAME_TAKEN_CACHE_SECONDS = 3600  # also invalidated on rename/delete
+USERNAME_FREE_CACHE_SECONDS = 30  # another process may register the name meanwhile
+# Hand write-view mutations to one writer thread per process that commits them
+# in groups (aether_notes.writer) instead of each request taking the write lock.
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "False") == "True"
+WRITE_QUEUE_MAX_BATCH = 64  # writes per group commit
+WRITE_QUEUE_TIMEOUT_SECONDS = 10  # how long a request waits for its write
+# Buffer witness/flag events in memory and write them in one transaction every
+# COUNTER_FLUSH_SECONDS instead of one per request (aether_notes.counters).
+# Responses then carry optimistic counts.
+COUNTER_WRITE_BEHIND = os.getenv("COUNTER_WRITE_BEHIND", "False") == "True"
+COUNTER_FLUSH_SECONDS = float(os.getenv("COUNTER_FLUSH_SECONDS", "1.0"))
+# `manage.py compact_counters` drops NoteView/NoteFlag rows of notes older than
+# this; Note.views/flags keep the totals. With COUNTER_SKETCH_ARCHIVED, notes on
+# archive pages keep an approximate set of viewers instead (aether_notes.maintenance),
+# and later witnesses of those notes are counted against it.
+COUNTER_DETAIL_RETENTION_DAYS = int(os.getenv("COUNTER_DETAIL_RETENTION_DAYS", "3"))
+COUNTER_SKETCH_ARCHIVED = os.getenv("COUNTER_SKETCH_ARCHIVED", "False") == "True"
+# Published notes past the 48h window are deleted unless their author keeps a
+# public archive: by `manage.py sweep_expired_notes`, or every N seconds by a
+# thread in the gunicorn worker when this is > 0.
+EXPIRY_SWEEP_INTERVAL_SECONDS = int(os.getenv("EXPIRY_SWEEP_INTERVAL_SECONDS", "0"))
+# Housekeeping jobs work in batches of this many notes, pausing between batches
+# so the SQLite write lock is only ever held briefly.
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "200"))
+MAINTENANCE_BATCH_PAUSE = float(os.getenv("MAINTENANCE_BATCH_PAUSE", "0.05"))
+# Crossposts are queued as pending NoteCrosspost rows and sent by a pool of
+# CROSSPOST_WORKERS threads in the app process (accounts.crosspost). Set it to 0
+# when running `manage.py crosspost_worker` as its own process instead.
+CROSSPOST_WORKERS = int(os.getenv("CROSSPOST_WORKERS", "2"))
+CROSSPOST_NETWORK_CONCURRENCY = {"mastodon": 2, "bluesky": 2, "status_cafe": 1}
+# Per-request timeout for each network's HTTP calls. A note's networks are
+# posted side by side, so one slow network doesn't hold up the others.
+CROSSPOST_TIMEOUT_SECONDS = {"mastodon": 20, "bluesky": 20, "status_cafe": 15}
+CROSSPOST_MAX_ATTEMPTS = 6
+CROSSPOST_RETRY_BASE_SECONDS = 30  # doubled after every failed attempt
+CROSSPOST_RETRY_MAX_SECONDS = 3600
+CROSSPOST_LEASE_SECONDS = 300  # a claimed row is retried if not settled by then
+CROSSPOST_POLL_SECONDS = 5  # idle workers look for due retries this often
+# How long a shared cache (e.g. Caddy) may serve the anonymous home/about pages
+# (s-maxage). Browsers always revalidate. See aether_notes.page_cache.
+ANON_PAGE_CACHE_SECONDS = int(os.getenv("ANON_PAGE_CACHE_SECONDS", "10"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
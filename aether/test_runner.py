@@ -0,0 +1,26 @@
+"""Test runner that keeps test runs off the checkout's shared state.
+
+The feed version is the modification time of ``FEED_VERSION_FILE``, which every
+process on the host watches. Tests bump it constantly, so they get a throwaway
+file instead of the one a dev server or the deployed site reads.
+"""
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._feed_version_dir = tempfile.TemporaryDirectory()
+        self._feed_version_file = override_settings(
+            FEED_VERSION_FILE=os.path.join(self._feed_version_dir.name, "feed.version")
+        )
+        self._feed_version_file.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._feed_version_file.disable()
+        self._feed_version_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
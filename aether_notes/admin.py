@@ -1,5 +1,7 @@
 from django.contrib import admin
+from .fields import parse_device_id
 from .models import Note, NoteFlag, NoteCrosspost
+from .search import matching_note_ids
 
 
 class HasFlagsFilter(admin.SimpleListFilter):
@@ -25,6 +27,13 @@ class NoteAdmin(admin.ModelAdmin):
     list_filter = (HasFlagsFilter,)
     ordering = ("-flags", "-pub_date")
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of LIKE '%term%' scans (aether_notes.search).
+        ids = matching_note_ids(search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
+
     @admin.display(description="text")
     def short_text(self, obj):
         return (obj.text[:80] + "…") if len(obj.text) > 80 else obj.text
@@ -33,13 +42,23 @@ class NoteAdmin(admin.ModelAdmin):
 @admin.register(NoteFlag)
 class NoteFlagAdmin(admin.ModelAdmin):
     list_display = ("note", "device_id", "created_at")
-    search_fields = ("device_id", "note__text")
+    search_fields = ("note__text",)
     ordering = ("-created_at",)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Device ids are stored as bytes, so they can only be matched exactly.
+        device_id = parse_device_id(search_term)
+        if device_id is not None:
+            return queryset.filter(device_id=device_id), False
+        ids = matching_note_ids(search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(note_id__in=ids), False
+
 
 @admin.register(NoteCrosspost)
 class NoteCrosspostAdmin(admin.ModelAdmin):
-    list_display = ("note", "network", "status", "short_remote", "created_at")
+    list_display = ("note", "network", "status", "attempts", "next_attempt_at", "short_remote", "created_at")
     list_filter = ("network", "status")
     search_fields = ("note__text", "remote_id", "remote_url")
     ordering = ("-created_at",)
@@ -0,0 +1,209 @@
+"""Write-behind buffer for the witness and flag counters (opt-in).
+
+With ``COUNTER_WRITE_BEHIND`` enabled, the counter views don't write to the
+database themselves. They record the event here and answer with an optimistic
+count, and a background thread flushes everything buffered in the last
+``COUNTER_FLUSH_SECONDS`` in a single transaction. That turns many small write
+transactions (each contending for SQLite's write lock with note creation) into
+one per interval.
+
+The buffer is per process: a crash loses at most one interval of counts. It is
+flushed on a normal interpreter exit and from gunicorn's ``worker_exit`` hook.
+"""
+import atexit
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .feed_cache import bump_feed_version
+from .models import Note, NoteFlag, NoteView, NoteViewSketch
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Flushes are serialised; the lock above only guards the buffers.
+        self._flush_lock = threading.Lock()
+        # note_id -> device ids with a first-time view not yet written.
+        self._views: dict[int, set[uuid.UUID]] = defaultdict(set)
+        # (note_id, device_id) -> desired flagged state, where it differs from
+        # what was in the database when the toggle was recorded.
+        self._flags: dict[tuple[int, uuid.UUID], bool] = {}
+        # Snapshots being written by the current flush. Still consulted so that
+        # events aren't recorded twice while the transaction is in progress.
+        self._flushing_views: dict[int, set[uuid.UUID]] = {}
+        self._flushing_flags: dict[tuple[int, uuid.UUID], bool] = {}
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # -- recording ---------------------------------------------------------
+
+    def add_view(self, note_id: int, device_id: uuid.UUID) -> bool:
+        """Buffer a first-time view. Returns False if the device already saw the note."""
+        with self._lock:
+            if self._has_view(note_id, device_id):
+                return False
+        if NoteView.objects.filter(note_id=note_id, device_id=device_id).exists():
+            return False
+        with self._lock:
+            if self._has_view(note_id, device_id):
+                return False
+            self._views[note_id].add(device_id)
+        self._ensure_started()
+        return True
+
+    def pending_views(self, note_id: int) -> int:
+        with self._lock:
+            return len(self._views.get(note_id, ())) + len(self._flushing_views.get(note_id, ()))
+
+    def toggle_flag(self, note_id: int, device_id: uuid.UUID) -> bool:
+        """Buffer a flag toggle and return the new flagged state."""
+        key = (note_id, device_id)
+        flagged_in_db = None
+        while True:
+            with self._lock:
+                current = self._known_flag(key)
+                if current is None:
+                    current = flagged_in_db
+                if current is not None:
+                    if key in self._flags:
+                        # Toggled back: the database (or the flush in progress)
+                        # already has the state we want.
+                        del self._flags[key]
+                    else:
+                        self._flags[key] = not current
+                    break
+            # Nothing buffered for the key (or a flush of it just finished):
+            # the database has the current state. Read it outside the lock.
+            flagged_in_db = NoteFlag.objects.filter(note_id=note_id, device_id=device_id).exists()
+        self._ensure_started()
+        return not current
+
+    def pending_flag_delta(self, note_id: int) -> int:
+        with self._lock:
+            # A flush snapshot may be superseded by a newer toggle of the same key.
+            merged = {**self._flushing_flags, **self._flags}
+            return sum(1 if flagged else -1 for (pk, _), flagged in merged.items() if pk == note_id)
+
+    def _has_view(self, note_id: int, device_id: uuid.UUID) -> bool:
+        return device_id in self._views.get(note_id, ()) or device_id in self._flushing_views.get(note_id, ())
+
+    def _known_flag(self, key: tuple[int, uuid.UUID]) -> bool | None:
+        if key in self._flags:
+            return self._flags[key]
+        return self._flushing_flags.get(key)
+
+    # -- flushing ----------------------------------------------------------
+
+    def flush(self) -> None:
+        """Write everything buffered so far in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._views and not self._flags:
+                    return
+                self._flushing_views, self._views = dict(self._views), defaultdict(set)
+                self._flushing_flags, self._flags = self._flags, {}
+            try:
+                with transaction.atomic():
+                    self._write(self._flushing_views, self._flushing_flags)
+                    transaction.on_commit(bump_feed_version)
+            except Exception:
+                logger.exception("Counter flush failed; keeping the events for the next one")
+                with self._lock:
+                    for note_id, devices in self._flushing_views.items():
+                        self._views[note_id] |= devices
+                    # Toggles recorded since the snapshot win.
+                    self._flags = {**self._flushing_flags, **self._flags}
+            finally:
+                with self._lock:
+                    self._flushing_views, self._flushing_flags = {}, {}
+
+    @staticmethod
+    def _write(views: dict[int, set[uuid.UUID]], flags: dict[tuple[int, uuid.UUID], bool]) -> None:
+        note_ids = set(views) | {note_id for note_id, _ in flags}
+        # Notes may have been deleted since the events were recorded.
+        existing = set(Note.objects.filter(pk__in=note_ids).values_list("pk", flat=True))
+
+        if views:
+            # Compacted notes count their devices in the sketch rather than new rows.
+            viewed = existing & set(views)
+            viewed -= NoteViewSketch.absorb({pk: views[pk] for pk in viewed}).keys()
+            seen = set(
+                NoteView.objects.filter(note_id__in=viewed)
+                .filter(device_id__in={d for devices in views.values() for d in devices})
+                .values_list("note_id", "device_id")
+            )
+            new_views = [
+                NoteView(note_id=note_id, device_id=device_id)
+                for note_id, devices in views.items()
+                if note_id in viewed
+                for device_id in devices
+                if (note_id, device_id) not in seen
+            ]
+            NoteView.objects.bulk_create(new_views, ignore_conflicts=True)
+            view_deltas = defaultdict(int)
+            for view in new_views:
+                view_deltas[view.note_id] += 1
+            _apply_deltas("views", view_deltas)
+
+        if flags:
+            flagged = dict(
+                (((note_id, device_id), pk) for pk, note_id, device_id in NoteFlag.objects.filter(
+                    note_id__in=existing & {note_id for note_id, _ in flags},
+                    device_id__in={device_id for _, device_id in flags},
+                ).values_list("pk", "note_id", "device_id"))
+            )
+            to_create = [key for key, want in flags.items() if want and key not in flagged and key[0] in existing]
+            to_delete = [key for key, want in flags.items() if not want and key in flagged]
+            NoteFlag.objects.bulk_create(
+                [NoteFlag(note_id=note_id, device_id=device_id) for note_id, device_id in to_create],
+                ignore_conflicts=True,
+            )
+            NoteFlag.objects.filter(pk__in=[flagged[key] for key in to_delete]).delete()
+            flag_deltas = defaultdict(int)
+            for note_id, _ in to_create:
+                flag_deltas[note_id] += 1
+            for note_id, _ in to_delete:
+                flag_deltas[note_id] -= 1
+            _apply_deltas("flags", flag_deltas)
+
+    # -- background thread -------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="counter-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.COUNTER_FLUSH_SECONDS):
+            self.flush()
+
+
+def _apply_deltas(field: str, deltas: dict[int, int]) -> None:
+    # One UPDATE per distinct delta; in practice almost every note moves by 1.
+    by_delta = defaultdict(list)
+    for note_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(note_id)
+    for delta, note_ids in by_delta.items():
+        Note.objects.filter(pk__in=note_ids).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+buffer = CounterBuffer()
+
+
+def enabled() -> bool:
+    return settings.COUNTER_WRITE_BEHIND
@@ -1,9 +1,32 @@
+import threading
+
+from django.conf import settings
 from django.db.backends.signals import connection_created
 from django.dispatch import receiver
 
+# Database files whose journal mode this process has already set. The mode is
+# persistent, so there's no need to pay for it on every new connection.
+_journal_mode_set = set()
+_journal_mode_lock = threading.Lock()
+
+
+def pragma_statements(profile):
+    """The PRAGMA statements for a profile name from SQLITE_PRAGMA_PROFILES."""
+    pragmas = settings.SQLITE_PRAGMA_PROFILES[profile]
+    return [f'PRAGMA {name}={value};' for name, value in pragmas.items()]
+
+
 @receiver(connection_created)
 def setup_sqlite_pragmas(sender, connection, **kwargs):
     if connection.vendor == 'sqlite':
         cursor = connection.cursor()
-        cursor.execute('PRAGMA journal_mode=wal;')
-        cursor.execute('PRAGMA busy_timeout=5000;')
+        # Query-only connections (the read replica) can't change the journal mode.
+        if not cursor.execute('PRAGMA query_only;').fetchone()[0]:
+            name = str(connection.settings_dict['NAME'])
+            if name not in _journal_mode_set:
+                with _journal_mode_lock:
+                    if name not in _journal_mode_set:
+                        cursor.execute(f'PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE};')
+                        _journal_mode_set.add(name)
+        for statement in pragma_statements(settings.SQLITE_PRAGMA_PROFILE):
+            cursor.execute(statement)
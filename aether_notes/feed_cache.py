@@ -0,0 +1,116 @@
+"""Versioned cache for the rendered home feed.
+
+The feed fragment (the list of note cards) is cached under a key derived from a
+version. Any change that affects the feed bumps the version (see
+``aether_notes.signals`` and the counter views), so stale fragments are simply
+never read again and age out of the cache on their own.
+
+The version is the modification time of ``FEED_VERSION_FILE`` rather than a
+cache entry: the cache is per process, and a bump from a management command or
+``crosspost_worker`` has to reach every web worker on the host. Reading it is
+one ``stat`` call.
+"""
+import datetime
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Note
+from .pagination import decode_cursor, keyset_page
+
+FEED_WINDOW = datetime.timedelta(days=2)
+
+# Single-flight guard: only one thread per worker rebuilds the fragment on a miss,
+# the others wait for it and then read the freshly cached copy.
+_rebuild_lock = threading.Lock()
+
+
+def feed_version() -> int:
+    try:
+        return os.stat(settings.FEED_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        bump_feed_version()
+        return os.stat(settings.FEED_VERSION_FILE).st_mtime_ns
+
+
+def bump_feed_version() -> None:
+    """Invalidate the cached feed (in every process) by moving to a new version."""
+    path = settings.FEED_VERSION_FILE
+    with open(path, "a"):
+        pass
+    # Always move forward, even if the clock hasn't ticked since the last bump.
+    version = max(time.time_ns(), os.stat(path).st_mtime_ns + 1)
+    os.utime(path, ns=(version, version))
+
+
+def _html_key(version: int) -> str:
+    return f"feed:html:{version}"
+
+
+def _page_key(version: int, cursor: str) -> str:
+    return f"feed:page:{version}:{cursor}"
+
+
+def feed_queryset():
+    """Published notes inside the feed window, with what the note cards need."""
+    cutoff = timezone.now() - FEED_WINDOW
+    return (
+        Note.objects.filter(pub_date__gte=cutoff, is_draft=False)
+        .with_author_card()
+        .with_crossposts()
+    )
+
+
+def _feed_page(cursor: str | None):
+    return keyset_page(feed_queryset(), cursor, settings.FEED_PAGE_SIZE)
+
+
+def build_feed_html() -> str:
+    """Query the first page of the feed window and render the feed fragment."""
+    notes, next_cursor = _feed_page(None)
+    return render_to_string("aether_notes/_feed.html", {"latest_note_list": notes, "next_cursor": next_cursor})
+
+
+def get_feed_html() -> str:
+    """Return the rendered feed fragment, rebuilding it at most once per version."""
+    html = cache.get(_html_key(feed_version()))
+    if html is not None:
+        return html
+
+    with _rebuild_lock:
+        # Another thread may have rebuilt it while we were waiting.
+        version = feed_version()
+        html = cache.get(_html_key(version))
+        if html is None:
+            html = build_feed_html()
+            cache.set(_html_key(version), html, timeout=settings.FEED_CACHE_SECONDS)
+    return html
+
+
+def get_feed_page(cursor: str) -> dict:
+    """Return ``{"html", "next"}`` for the feed page after ``cursor``.
+
+    Raises pagination.InvalidCursor for malformed cursors. Pages are cached under
+    the same version as the first one, since every reader scrolls the same cursors.
+    """
+    decode_cursor(cursor)  # validate before it becomes part of a cache key
+    key = _page_key(feed_version(), cursor)
+    page = cache.get(key)
+    if page is None:
+        notes, next_cursor = _feed_page(cursor)
+        page = {
+            "html": render_to_string("aether_notes/_note_cards.html", {"notes": notes}),
+            "next": next_cursor,
+        }
+        cache.set(key, page, timeout=settings.FEED_CACHE_SECONDS)
+    return page
+
+
+def warm_feed_cache() -> None:
+    """Populate the cache ahead of the first request (called at worker boot)."""
+    get_feed_html()
@@ -0,0 +1,64 @@
+"""In-process publish/subscribe hub for the live feed (Server-Sent Events).
+
+Each open ``/live/`` stream subscribes an asyncio queue on its event loop. Model
+signals publish newly published notes (as rendered cards) and deletions from
+whatever thread did the write; events are handed to each subscriber's loop
+thread-safely. The hub only sees writes made by the same process, so live push
+needs the app served from the ASGI entry point (``make serve-asgi``).
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class LiveHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        sub = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(sub)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+    def publish(self, event: str, data: dict) -> None:
+        """Send an event to every subscriber. Safe to call from any thread."""
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # Loop already closed; its stream is going away.
+                pass
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, message: str) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: drop the event rather than buffer without bound. The
+            # page still catches up on its next reload.
+            pass
+
+
+hub = LiveHub()
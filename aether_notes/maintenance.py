@@ -0,0 +1,170 @@
+"""Background housekeeping for the notes tables.
+
+Jobs run in small batches, each in its own short transaction followed by a
+pause, so that requests waiting on SQLite's write lock are never held up for
+long.
+"""
+import datetime
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .feed_cache import FEED_WINDOW
+from .models import Note, NoteFlag, NoteView, NoteViewSketch
+from .sketch import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+
+def compact_counter_details(
+    older_than: datetime.timedelta,
+    *,
+    sketch_archived: bool = False,
+    batch_size: int | None = None,
+    pause: float | None = None,
+) -> dict[str, int]:
+    """Delete NoteView/NoteFlag rows of notes published before ``now - older_than``.
+
+    Once a note has left the feed its detail rows only serve to dedupe witnesses
+    that no longer arrive; Note.views/Note.flags keep the totals. With
+    ``sketch_archived``, notes shown on an archive page fold their viewers into a
+    NoteViewSketch first, and their view count is re-derived from it, so a device
+    witnessing again after compaction is (approximately) not counted twice.
+
+    Returns counts of notes processed and rows removed.
+    """
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    pause = settings.MAINTENANCE_BATCH_PAUSE if pause is None else pause
+    cutoff = timezone.now() - older_than
+    candidates = (
+        Note.objects.filter(pub_date__lt=cutoff)
+        .filter(
+            Exists(NoteView.objects.filter(note=OuterRef("pk")))
+            | Exists(NoteFlag.objects.filter(note=OuterRef("pk")))
+        )
+        .order_by("pk")
+    )
+
+    totals = {"notes": 0, "views": 0, "flags": 0, "sketched": 0}
+    last_pk = 0
+    while True:
+        note_ids = list(candidates.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+        if not note_ids:
+            break
+        last_pk = note_ids[-1]
+
+        archived = set()
+        if sketch_archived:
+            archived = set(
+                Note.objects.filter(pk__in=note_ids, user__profile__show_archive=True).values_list("pk", flat=True)
+            )
+        with transaction.atomic():
+            if archived:
+                totals["sketched"] += _fold_views_into_sketches(archived)
+            views_deleted, _ = NoteView.objects.filter(note_id__in=note_ids).delete()
+            flags_deleted, _ = NoteFlag.objects.filter(note_id__in=note_ids).delete()
+
+        totals["notes"] += len(note_ids)
+        totals["views"] += views_deleted
+        totals["flags"] += flags_deleted
+        if pause:
+            time.sleep(pause)
+    return totals
+
+
+def _fold_views_into_sketches(note_ids: set[int]) -> int:
+    devices: dict[int, list] = {pk: [] for pk in note_ids}
+    for note_id, device_id in NoteView.objects.filter(note_id__in=note_ids).values_list("note_id", "device_id"):
+        devices[note_id].append(device_id)
+    views = dict(Note.objects.filter(pk__in=note_ids).values_list("pk", "views"))
+    sketches = {s.note_id: s for s in NoteViewSketch.objects.filter(note_id__in=note_ids)}
+
+    new_sketches, changed_sketches = [], []
+    now = timezone.now()
+    for note_id, device_ids in devices.items():
+        if not device_ids:
+            continue
+        sketch = sketches.get(note_id)
+        hll = HyperLogLog(sketch.registers if sketch else None)
+        for device_id in device_ids:
+            hll.add(device_id.bytes)
+        if sketch is None:
+            # The current count stands; whatever the sketch doesn't account for
+            # (rows compacted earlier, estimation error) stays as a fixed offset.
+            sketch = NoteViewSketch(note_id=note_id, base=max(views.get(note_id, 0) - hll.estimate(), 0))
+            new_sketches.append(sketch)
+        else:
+            changed_sketches.append(sketch)
+        sketch.registers = hll.to_bytes()
+        sketch.updated_at = now
+        Note.objects.filter(pk=note_id).update(views=sketch.base + hll.estimate())
+
+    NoteViewSketch.objects.bulk_create(new_sketches)
+    NoteViewSketch.objects.bulk_update(changed_sketches, ["registers", "updated_at"])
+    return len(new_sketches) + len(changed_sketches)
+
+
+def sweep_expired_notes(*, batch_size: int | None = None, pause: float | None = None) -> Counter:
+    """Delete published notes that have faded out of the feed and aren't kept on an archive page.
+
+    Notes by users with a public archive stay; drafts are never expired. Returns
+    the number of rows removed per model (notes plus their cascaded rows).
+    """
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    pause = settings.MAINTENANCE_BATCH_PAUSE if pause is None else pause
+    cutoff = timezone.now() - FEED_WINDOW
+    expired = (
+        Note.objects.filter(pub_date__lt=cutoff, is_draft=False)
+        .exclude(user__profile__show_archive=True)
+        .order_by("pk")
+    )
+
+    removed = Counter()
+    last_pk = 0
+    while True:
+        note_ids = list(expired.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+        if not note_ids:
+            break
+        last_pk = note_ids[-1]
+        with transaction.atomic():
+            # Re-check the conditions: an author may have turned their archive on
+            # since the ids were read.
+            _, per_model = expired.filter(pk__in=note_ids).delete()
+        removed.update(per_model)
+        if pause:
+            time.sleep(pause)
+    return removed
+
+
+_sweeper: threading.Thread | None = None
+
+
+def start_expiry_sweeper(interval: float) -> None:
+    """Run sweep_expired_notes every ``interval`` seconds in a daemon thread.
+
+    Meant for a single worker process (see gunicorn_config.post_worker_init).
+    """
+    global _sweeper
+    if _sweeper is not None:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                removed = sweep_expired_notes()
+                if removed:
+                    logger.info("Expired notes swept: %s", dict(removed))
+            except Exception:
+                logger.exception("Expiry sweep failed")
+            finally:
+                connections.close_all()
+
+    _sweeper = threading.Thread(target=run, name="expiry-sweeper", daemon=True)
+    _sweeper.start()
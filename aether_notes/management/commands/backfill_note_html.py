@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from aether_notes.feed_cache import bump_feed_version
+from aether_notes.models import Note, render_note_html
+
+
+class Command(BaseCommand):
+    help = "Render and store Note.text_html for notes saved before it existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every note, not just those missing text_html (e.g. after changing the renderer).",
+        )
+
+    def handle(self, *args, batch_size, all, **options):
+        qs = Note.objects.order_by("pk").only("pk", "text", "text_html")
+        if not all:
+            qs = qs.filter(text_html="")
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for note in batch:
+                note.text_html = render_note_html(note.text)
+            # bulk_update skips Note.save(), so text_html is set explicitly above.
+            Note.objects.bulk_update(batch, ["text_html"])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+
+        if updated:
+            bump_feed_version()
+        self.stdout.write(self.style.SUCCESS(f"Rendered {updated} note(s)."))
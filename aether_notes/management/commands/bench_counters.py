@@ -0,0 +1,92 @@
+import statistics
+import time
+import uuid
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from aether_notes.models import Note, NoteFlag, NoteView
+
+
+def legacy_witness(note_id, device_id):
+    """The witness view's database work before NoteView.record."""
+    note = Note.objects.get(pk=note_id)
+    try:
+        with transaction.atomic():
+            NoteView.objects.create(note=note, device_id=device_id)
+            Note.objects.filter(pk=note.pk).update(views=F("views") + 1)
+    except IntegrityError:
+        return note.views
+    note.refresh_from_db(fields=["views"])
+    return note.views
+
+
+def legacy_flag(note_id, device_id):
+    """The flag_note view's database work before NoteFlag.toggle."""
+    note = Note.objects.get(pk=note_id)
+    try:
+        with transaction.atomic():
+            NoteFlag.objects.create(note=note, device_id=device_id)
+            Note.objects.filter(pk=note.pk).update(flags=F("flags") + 1)
+            note.refresh_from_db(fields=["flags"])
+            return note.flags
+    except IntegrityError:
+        with transaction.atomic():
+            NoteFlag.objects.filter(note=note, device_id=device_id).delete()
+            Note.objects.filter(pk=note.pk, flags__gt=0).update(flags=F("flags") - 1)
+            note.refresh_from_db(fields=["flags"])
+            return note.flags
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare statements per call and latency of the witness/flag database paths, "
+        "old (get + insert + update + refresh) against new (NoteView.record / NoteFlag.toggle). "
+        "Writes to a scratch draft note that is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, iterations, **options):
+        # A draft, so the benchmark never shows up in (or invalidates) the feed.
+        note = Note.objects.create(text="counter benchmark", pub_date=timezone.now(), is_draft=True)
+        try:
+            repeat_device = uuid.uuid4()
+            NoteView.objects.create(note=note, device_id=repeat_device)
+            cases = [
+                ("witness (first view)", lambda: legacy_witness(note.pk, uuid.uuid4()),
+                 lambda: NoteView.record(note.pk, uuid.uuid4())),
+                ("witness (repeat)", lambda: legacy_witness(note.pk, repeat_device),
+                 lambda: NoteView.record(note.pk, repeat_device)),
+                ("flag toggle", lambda: legacy_flag(note.pk, repeat_device),
+                 lambda: NoteFlag.toggle(note.pk, repeat_device)),
+            ]
+            self.stdout.write(f"{'path':<22}{'impl':<8}{'stmts/call':>11}{'mean µs':>10}{'p95 µs':>10}")
+            for name, old, new in cases:
+                for impl, fn in (("old", old), ("new", new)):
+                    statements, timings = self._measure(fn, iterations)
+                    self.stdout.write(
+                        f"{name:<22}{impl:<8}{statements:>11.1f}"
+                        f"{statistics.fmean(timings):>10.0f}{statistics.quantiles(timings, n=20)[-1]:>10.0f}"
+                    )
+        finally:
+            note.delete()
+
+    @staticmethod
+    def _measure(fn, iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(iterations):
+                fn()
+        # Timed separately: capturing queries adds its own overhead.
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1e6)
+        # BEGIN/COMMIT are round trips too, but both versions pay them once per call.
+        statements = [q for q in ctx.captured_queries if q["sql"] not in ("BEGIN", "COMMIT")]
+        return len(statements) / iterations, timings
@@ -0,0 +1,141 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from aether_notes.feed_cache import feed_queryset
+from aether_notes.models import Note, NoteView
+from aether_notes.pagination import keyset_page
+
+
+def read_feed(note_ids):
+    keyset_page(feed_queryset(), None, settings.FEED_PAGE_SIZE)
+
+
+def witness(note_ids):
+    NoteView.record(random.choice(note_ids), uuid.uuid4())
+
+
+def create(note_ids):
+    note = Note.objects.create(text="profile benchmark", pub_date=timezone.now())
+    note_ids.append(note.pk)
+
+
+OPERATIONS = {"feed": read_feed, "witness": witness, "create": create}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a feed/witness/create mix from concurrent threads against a copy of the database "
+        "once per SQLite pragma profile (SQLITE_PRAGMA_PROFILES), and report throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("profiles", nargs="*", help="Profiles to compare (default: all).")
+        parser.add_argument("--ops", type=int, default=2000, help="Operations per profile.")
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent threads (gunicorn runs 8).")
+        parser.add_argument("--mix", type=parse_mix, default="feed=80,witness=18,create=2")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, profiles, ops, threads, mix, seed, **options):
+        profiles = profiles or list(settings.SQLITE_PRAGMA_PROFILES)
+        unknown = set(profiles) - set(settings.SQLITE_PRAGMA_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}.")
+        source = str(settings.DATABASES["default"]["NAME"])
+
+        self.stdout.write(f"{ops} ops on {threads} threads, mix {mix}\n")
+        self.stdout.write(f"{'profile':<12}{'op':<10}{'count':>7}{'mean ms':>10}{'p95 ms':>10}{'errors':>8}")
+        with tempfile.TemporaryDirectory() as tmp:
+            for profile in profiles:
+                # A fresh copy per profile, so each one starts from the same data.
+                copy = Path(tmp) / f"{profile}.sqlite3"
+                src, dst = sqlite3.connect(f"file:{source}?mode=ro", uri=True), sqlite3.connect(copy)
+                with closing(src), closing(dst):
+                    src.backup(dst)
+                with self._database(source, str(copy)), override_settings(SQLITE_PRAGMA_PROFILE=profile):
+                    random.seed(seed)
+                    elapsed, timings, errors = self._replay(ops, threads, mix)
+                for name in mix:
+                    times = timings[name]
+                    mean = statistics.fmean(times) if times else 0
+                    p95 = statistics.quantiles(times, n=20)[-1] if len(times) > 1 else mean
+                    self.stdout.write(f"{profile:<12}{name:<10}{len(times):>7}{mean:>10.2f}{p95:>10.2f}{errors[name]:>8}")
+                self.stdout.write(self.style.SUCCESS(f"{profile:<12}{ops / elapsed:.0f} ops/s\n"))
+
+    @staticmethod
+    @contextmanager
+    def _database(source, copy):
+        """Point every alias on the primary file at ``copy`` for the duration of the block."""
+        connections.close_all()
+        aliases = [alias for alias in connections if str(connections[alias].settings_dict["NAME"]) == source]
+        for alias in aliases:
+            connections[alias].settings_dict["NAME"] = copy
+        try:
+            yield
+        finally:
+            connections.close_all()
+            for alias in aliases:
+                connections[alias].settings_dict["NAME"] = source
+
+    @staticmethod
+    def _replay(ops, threads, mix):
+        note_ids = list(Note.objects.filter(is_draft=False).values_list("pk", flat=True))
+        if not note_ids:
+            note_ids.append(Note.objects.create(text="profile benchmark", pub_date=timezone.now()).pk)
+        plan = random.choices(list(mix), weights=list(mix.values()), k=ops)
+        timings, errors = defaultdict(list), defaultdict(int)
+        lock = threading.Lock()
+        position = iter(range(ops))
+
+        def work():
+            try:
+                while True:
+                    with lock:
+                        i = next(position, None)
+                    if i is None:
+                        return
+                    name = plan[i]
+                    start = time.perf_counter()
+                    try:
+                        OPERATIONS[name](note_ids)
+                    except OperationalError:
+                        # "database is locked" after busy_timeout.
+                        with lock:
+                            errors[name] += 1
+                        continue
+                    took = (time.perf_counter() - start) * 1000
+                    with lock:
+                        timings[name].append(took)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, timings, errors
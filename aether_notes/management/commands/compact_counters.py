@@ -0,0 +1,40 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from aether_notes.maintenance import compact_counter_details
+
+
+class Command(BaseCommand):
+    help = "Delete per-device view/flag rows of notes that left the feed long ago, keeping their counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.COUNTER_DETAIL_RETENTION_DAYS,
+            help="Compact notes published more than this many days ago.",
+        )
+        parser.add_argument(
+            "--sketch-archived",
+            action="store_true",
+            default=settings.COUNTER_SKETCH_ARCHIVED,
+            help="Keep an approximate viewer sketch for notes shown on archive pages.",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.MAINTENANCE_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=settings.MAINTENANCE_BATCH_PAUSE)
+
+    def handle(self, *args, days, sketch_archived, batch_size, pause, **options):
+        totals = compact_counter_details(
+            datetime.timedelta(days=days),
+            sketch_archived=sketch_archived,
+            batch_size=batch_size,
+            pause=pause,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compacted {totals['notes']} note(s): removed {totals['views']} view and "
+                f"{totals['flags']} flag row(s), {totals['sketched']} sketch(es) updated."
+            )
+        )
@@ -0,0 +1,57 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from aether_notes.feed_cache import bump_feed_version
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the read replica snapshot (DATABASE_REPLICA_PATH)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.DATABASE_REPLICA_PATH, help="Snapshot file to write.")
+        parser.add_argument(
+            "--every",
+            type=float,
+            default=0,
+            help="Keep running and refresh the snapshot every this many seconds.",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=256,
+            help="Pages copied per step; the primary is only read-locked while a step runs.",
+        )
+
+    def handle(self, *args, output, every, pages, **options):
+        source = str(settings.DATABASES["default"]["NAME"])
+        if not output:
+            raise CommandError("No snapshot path: pass --output or set DATABASE_REPLICA_PATH.")
+        if output == source:
+            raise CommandError("The snapshot path is the primary database itself.")
+
+        while True:
+            started = time.monotonic()
+            self._snapshot(source, output, pages)
+            # Fragments and ETags built since the last refresh may hold the older
+            # snapshot's notes under the current version; move past them.
+            bump_feed_version()
+            self.stdout.write(self.style.SUCCESS(f"Replica refreshed in {time.monotonic() - started:.2f}s: {output}"))
+            if not every:
+                return
+            time.sleep(every)
+
+    @staticmethod
+    def _snapshot(source: str, output: str, pages: int) -> None:
+        # Backing up into the live file (rather than replacing it) keeps it
+        # consistent for replica connections that are already open: SQLite locks
+        # the destination while the copy is written, and they simply reread it.
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        dst = sqlite3.connect(output, timeout=30)
+        try:
+            src.backup(dst, pages=pages, sleep=0.005)
+        finally:
+            dst.close()
+            src.close()
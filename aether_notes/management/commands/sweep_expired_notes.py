@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from aether_notes.maintenance import sweep_expired_notes
+
+
+class Command(BaseCommand):
+    help = "Delete published notes older than the feed window, except those on a public archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.MAINTENANCE_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=settings.MAINTENANCE_BATCH_PAUSE)
+
+    def handle(self, *args, batch_size, pause, **options):
+        removed = sweep_expired_notes(batch_size=batch_size, pause=pause)
+        notes = removed.pop("aether_notes.Note", 0)
+        details = ", ".join(f"{count} {label}" for label, count in sorted(removed.items()))
+        self.stdout.write(self.style.SUCCESS(f"Removed {notes} expired note(s)" + (f" ({details})." if details else ".")))
@@ -0,0 +1,62 @@
+from asgiref.sync import iscoroutinefunction
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from .writer import WriteQueueTimeout, write_timings
+
+
+def _add_server_timing(response, timings: list[float]) -> None:
+    if not timings:
+        return
+    metric = f'db-write;dur={sum(timings):.2f};desc="{len(timings)} write(s)"'
+    existing = response.get("Server-Timing")
+    response["Server-Timing"] = f"{existing}, {metric}" if existing else metric
+
+
+def _write_timeout_response(exception):
+    # Clients retry on 503. "pending" means the write may still land, so they
+    # should reload rather than resend it.
+    return JsonResponse(
+        {"ok": False, "error": "write_pending" if exception.started else "write_timeout"},
+        status=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@sync_and_async_middleware
+def write_timing_middleware(get_response):
+    """Report the time a request spent in database writes (writer.run_write) as Server-Timing.
+
+    Also answers a view's WriteQueueTimeout with a 503.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            timings = []
+            token = write_timings.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                write_timings.reset(token)
+            _add_server_timing(response, timings)
+            return response
+
+    else:
+
+        def middleware(request):
+            timings = []
+            token = write_timings.set(timings)
+            try:
+                response = get_response(request)
+            finally:
+                write_timings.reset(token)
+            _add_server_timing(response, timings)
+            return response
+
+    def process_exception(request, exception):
+        if isinstance(exception, WriteQueueTimeout):
+            return _write_timeout_response(exception)
+        return None
+
+    middleware.process_exception = process_exception
+    return middleware
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0012_note_is_draft_note_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:54
+
+import uuid
+
+import aether_notes.fields
+from django.db import migrations
+
+# Stable namespace for ids that weren't UUIDs: the same legacy string always maps
+# to the same device.
+LEGACY_DEVICE_NAMESPACE = uuid.UUID("6f0c6f52-5d54-4c4e-9a59-2b1f0b9d2e71")
+
+# (model, column, unique per note)
+DEVICE_COLUMNS = [
+    ("note", "created_device_id", False),
+    ("noteview", "device_id", True),
+    ("noteflag", "device_id", True),
+]
+
+
+def _legacy_to_uuid(value: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(value.strip())
+    except ValueError:
+        return uuid.uuid5(LEGACY_DEVICE_NAMESPACE, value)
+
+
+def text_to_bytes(apps, schema_editor):
+    """Convert the text ids left in place by the column type change into 16 bytes."""
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, column, unique in DEVICE_COLUMNS:
+            table = qn(apps.get_model("aether_notes", model_name)._meta.db_table)
+            cursor.execute(f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'text'")
+            rows = cursor.fetchall()
+            cursor.executemany(
+                f"UPDATE OR IGNORE {table} SET {column} = %s WHERE id = %s",
+                [(_legacy_to_uuid(value).bytes if value.strip() else None, pk) for pk, value in rows],
+            )
+            if unique:
+                # Spellings of an id already seen for the note (e.g. upper case)
+                # collide with the converted row; that device was already counted.
+                cursor.execute(f"DELETE FROM {table} WHERE typeof({column}) = 'text'")
+
+
+def bytes_to_text(apps, schema_editor):
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, column, _ in DEVICE_COLUMNS:
+            table = qn(apps.get_model("aether_notes", model_name)._meta.db_table)
+            cursor.execute(f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'blob'")
+            rows = cursor.fetchall()
+            cursor.executemany(
+                f"UPDATE {table} SET {column} = %s WHERE id = %s",
+                [(str(uuid.UUID(bytes=bytes(value))), pk) for pk, value in rows],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0013_note_text_html'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='created_device_id',
+            field=aether_notes.fields.DeviceIdField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='noteflag',
+            name='device_id',
+            field=aether_notes.fields.DeviceIdField(),
+        ),
+        migrations.AlterField(
+            model_name='noteview',
+            name='device_id',
+            field=aether_notes.fields.DeviceIdField(),
+        ),
+        migrations.RunPython(text_to_bytes, bytes_to_text),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0014_device_id_binary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteViewSketch',
+            fields=[
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_sketch', serialize=False, to='aether_notes.note')),
+                ('registers', models.BinaryField()),
+                ('base', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0015_noteviewsketch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('is_draft', False)), fields=['-pub_date', '-id'], name='note_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('is_draft', False)), fields=['user', '-pub_date', '-id'], name='note_archive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('is_draft', True)), fields=['user', '-last_modified'], name='note_drafts_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Full-text index over Note.text/author (see aether_notes.search). It is an
+# external-content FTS5 table: it stores only the index and reads text from
+# aether_notes_note, kept in sync by the triggers below.
+#
+# NB: SQLite migrations that rebuild aether_notes_note (most AlterField/RemoveField
+# operations) drop these triggers with the old table. Such migrations must re-run
+# CREATE_TRIGGERS and rebuild the index afterwards;
+# NoteSearchTests.test_sync_triggers_survive_migrations fails until they do.
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE aether_notes_note_fts USING fts5(
+    text, author,
+    content='aether_notes_note', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+INSERT INTO aether_notes_note_fts(aether_notes_note_fts) VALUES ('rebuild');
+"""
+
+CREATE_TRIGGERS = """
+CREATE TRIGGER aether_notes_note_fts_ai AFTER INSERT ON aether_notes_note BEGIN
+    INSERT INTO aether_notes_note_fts(rowid, text, author) VALUES (new.id, new.text, new.author);
+END;
+CREATE TRIGGER aether_notes_note_fts_ad AFTER DELETE ON aether_notes_note BEGIN
+    INSERT INTO aether_notes_note_fts(aether_notes_note_fts, rowid, text, author)
+    VALUES ('delete', old.id, old.text, old.author);
+END;
+CREATE TRIGGER aether_notes_note_fts_au AFTER UPDATE OF text, author ON aether_notes_note BEGIN
+    INSERT INTO aether_notes_note_fts(aether_notes_note_fts, rowid, text, author)
+    VALUES ('delete', old.id, old.text, old.author);
+    INSERT INTO aether_notes_note_fts(rowid, text, author) VALUES (new.id, new.text, new.author);
+END;
+"""
+
+DROP = """
+DROP TRIGGER IF EXISTS aether_notes_note_fts_ai;
+DROP TRIGGER IF EXISTS aether_notes_note_fts_ad;
+DROP TRIGGER IF EXISTS aether_notes_note_fts_au;
+DROP TABLE IF EXISTS aether_notes_note_fts;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0016_note_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TABLE + CREATE_TRIGGERS, DROP),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aether_notes', '0017_note_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notecrosspost',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notecrosspost',
+            name='face',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='notecrosspost',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notecrosspost',
+            name='network',
+            field=models.CharField(choices=[('mastodon', 'Mastodon'), ('bluesky', 'Bluesky'), ('status_cafe', 'Status.cafe')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='notecrosspost',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['network', 'next_attempt_at'], name='crosspost_pending_idx'),
+        ),
+    ]
@@ -1,13 +1,44 @@
 import datetime
+import uuid
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.template.defaultfilters import linebreaksbr, urlize
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.conf import settings
 
+from .fields import DeviceIdField
+from .sketch import HyperLogLog
+
+
+# What a note card shows about a registered author. Loaded with the note in one
+# join so feed rendering never touches the profile's encrypted secrets.
+AUTHOR_CARD_FIELDS = ("user__username", "user__profile__show_archive", "user__profile__website")
+
+
+class NoteQuerySet(models.QuerySet):
+    def with_author_card(self):
+        """Select each note's author card (username, archive flag, website) in the same query."""
+        note_fields = [f.name for f in self.model._meta.concrete_fields]
+        return self.select_related("user__profile").only(*note_fields, *AUTHOR_CARD_FIELDS)
+
+    def with_crossposts(self):
+        """Prefetch the crossposts a note card links to (pending and failed ones are left out)."""
+        return self.prefetch_related(
+            models.Prefetch("crossposts", queryset=NoteCrosspost.objects.filter(status=NoteCrosspost.SUCCESS))
+        )
+
+
+def render_note_html(text: str) -> str:
+    """Safe HTML for a note's text; same output as ``{{ text|urlize|linebreaksbr }}``."""
+    return linebreaksbr(urlize(text, autoescape=True), autoescape=True)
+
 
 # Create your models here.
 class Note(models.Model):
     text = models.TextField()
+    # Rendered once on save (render_note_html) so templates don't run urlize per request.
+    text_html = models.TextField(blank=True, editable=False)
     pub_date = models.DateTimeField("date published", db_index=True)
     author = models.CharField(max_length=25, null=True, blank=True)
     # If authored by a registered user (optional)
@@ -17,25 +48,62 @@ class Note(models.Model):
     # Denormalized count of user flags (unique per device). Updated via NoteFlag.
     flags = models.PositiveIntegerField(default=0)
     # Device that created the note (client-generated UUID). Used for delete authorization.
-    created_device_id = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    created_device_id = DeviceIdField(null=True, blank=True, db_index=True)
     # Draft support
     is_draft = models.BooleanField(default=False, db_index=True)
     last_modified = models.DateTimeField(auto_now=True)
 
+    objects = NoteQuerySet.as_manager()
+
+    class Meta:
+        # One index per hot query shape, each covering its filter and sort (see
+        # QueryPlanTests): the home feed, an author's archive, an author's drafts.
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], condition=models.Q(is_draft=False), name="note_feed_idx"),
+            models.Index(
+                fields=["user", "-pub_date", "-id"], condition=models.Q(is_draft=False), name="note_archive_idx"
+            ),
+            models.Index(fields=["user", "-last_modified"], condition=models.Q(is_draft=True), name="note_drafts_idx"),
+        ]
+
     def __str__(self) -> str:
         return self.text
 
+    def save(self, *args, **kwargs):
+        self.text_html = render_note_html(self.text)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "text" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "text_html"}
+        super().save(*args, **kwargs)
+
+    @property
+    def rendered_text(self):
+        # Rows saved before text_html existed fall back to rendering on the fly
+        # (see the backfill_note_html command).
+        if self.text_html or not self.text:
+            return mark_safe(self.text_html)
+        return render_note_html(self.text)
+
     def was_published_recently(self):
         return self.pub_date >= timezone.now() - datetime.timedelta(days=1)
 
 
+def _sql_names(model) -> tuple[str, str]:
+    qn = connection.ops.quote_name
+    return qn(model._meta.db_table), qn(Note._meta.db_table)
+
+
+def _sql_now():
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
 class NoteView(models.Model):
     """Unique record that a device has seen a note.
 
-    We don't track users; instead, store a random device_id string (UUID) provided by the client.
+    We don't track users; instead, store a random device_id (UUID) provided by the client.
     """
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="note_views")
-    device_id = models.CharField(max_length=64)
+    device_id = DeviceIdField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -46,10 +114,53 @@ class NoteView(models.Model):
             models.Index(fields=["device_id", "created_at"]),
         ]
 
+    @classmethod
+    def record(cls, note_id: int, device_id: uuid.UUID) -> tuple[int | None, bool, datetime.datetime | None]:
+        """Record a first-time view in two statements; returns ``(views, created, pub_date)``.
+
+        ``views`` and ``pub_date`` are None if the note doesn't exist. A repeat
+        view is a no-op insert rather than an IntegrityError. Notes whose view
+        rows were compacted into a NoteViewSketch count the device there instead.
+        """
+        view_table, note_table = _sql_names(cls)
+        sketch_table = connection.ops.quote_name(NoteViewSketch._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Selecting from the note table makes a missing (or sketched) note insert nothing.
+            cursor.execute(
+                f"INSERT INTO {view_table} (note_id, device_id, created_at) "
+                f"SELECT id, %s, %s FROM {note_table} WHERE id = %s "
+                f"AND NOT EXISTS (SELECT 1 FROM {sketch_table} WHERE note_id = %s) "
+                "ON CONFLICT DO NOTHING",
+                [device_id.bytes, _sql_now(), note_id, note_id],
+            )
+            created = cursor.rowcount == 1
+            if created:
+                cursor.execute(
+                    f"UPDATE {note_table} SET views = views + 1 WHERE id = %s RETURNING views, pub_date", [note_id]
+                )
+                row = cursor.fetchone()
+            else:
+                cursor.execute(
+                    f"SELECT views, pub_date, EXISTS (SELECT 1 FROM {sketch_table} WHERE note_id = %s) "
+                    f"FROM {note_table} WHERE id = %s",
+                    [note_id, note_id],
+                )
+                row = cursor.fetchone()
+                if row is not None and row[2]:
+                    views, created = NoteViewSketch.absorb({note_id: [device_id]})[note_id]
+                    row = (views, row[1])
+        if row is None:
+            return None, created, None
+        views, pub_date = row[:2]
+        if settings.USE_TZ and timezone.is_naive(pub_date):
+            # Raw rows come back as naive UTC.
+            pub_date = timezone.make_aware(pub_date, datetime.timezone.utc)
+        return views, created, pub_date
+
 class NoteFlag(models.Model):
     """Unique record that a device has flagged a note."""
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="note_flags")
-    device_id = models.CharField(max_length=64)
+    device_id = DeviceIdField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -60,26 +171,104 @@ class NoteFlag(models.Model):
             models.Index(fields=["device_id", "created_at"]),
         ]
 
+    @classmethod
+    def toggle(cls, note_id: int, device_id: uuid.UUID) -> tuple[int | None, bool]:
+        """Flag or unflag a note for a device in two statements; returns ``(flags, flagged)``.
+
+        ``flags`` is None if the note doesn't exist.
+        """
+        flag_table, note_table = _sql_names(cls)
+        exists = f"EXISTS (SELECT 1 FROM {flag_table} WHERE note_id = %s AND device_id = %s)"
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Moving the counter first takes the write lock, so the flag row can't
+            # change between the check here and the insert/delete below.
+            cursor.execute(
+                f"UPDATE {note_table} SET flags = CASE WHEN {exists} THEN MAX(flags - 1, 0) ELSE flags + 1 END "
+                f"WHERE id = %s RETURNING flags, {exists}",
+                [note_id, device_id.bytes, note_id, note_id, device_id.bytes],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None, False
+            flags, was_flagged = row
+            if was_flagged:
+                cursor.execute(
+                    f"DELETE FROM {flag_table} WHERE note_id = %s AND device_id = %s", [note_id, device_id.bytes]
+                )
+            else:
+                cursor.execute(
+                    f"INSERT INTO {flag_table} (note_id, device_id, created_at) VALUES (%s, %s, %s) "
+                    "ON CONFLICT DO NOTHING",
+                    [note_id, device_id.bytes, _sql_now()],
+                )
+        return flags, not was_flagged
+
+
+class NoteViewSketch(models.Model):
+    """Approximate set of the devices that witnessed a note, kept once its NoteView
+    rows have been compacted away (archived notes only; see
+    ``maintenance.compact_counter_details``)."""
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, primary_key=True, related_name="view_sketch")
+    # HyperLogLog registers (sketch.HyperLogLog).
+    registers = models.BinaryField()
+    # Views counted before the sketch existed that it doesn't cover (e.g. rows
+    # compacted earlier without a sketch). Note.views == base + estimate.
+    base = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def absorb(cls, views) -> dict[int, tuple[int, bool]]:
+        """Count witnesses of compacted notes in their sketches instead of NoteView rows.
+
+        ``views`` maps note ids to device ids. For each note that has a sketch the
+        devices are added to it and Note.views becomes ``base + estimate``, so a
+        device that witnessed the note before compaction is (approximately) not
+        counted again. Returns ``{note_id: (views, added)}`` for those notes; the
+        others still need NoteView rows. Call inside the write transaction.
+        """
+        result = {}
+        for sketch in cls.objects.filter(note_id__in=views):
+            hll = HyperLogLog(sketch.registers)
+            # A list, not a generator: every device goes in, whatever the first returns.
+            added = any([hll.add(device_id.bytes) for device_id in views[sketch.note_id]])
+            count = sketch.base + hll.estimate()
+            if added:
+                sketch.registers = hll.to_bytes()
+                sketch.save(update_fields=["registers", "updated_at"])
+                Note.objects.filter(pk=sketch.note_id).update(views=count)
+            result[sketch.note_id] = (count, added)
+        return result
+
 
 class NoteCrosspost(models.Model):
-    """Stores metadata about a note cross-posted to an external network.
+    """A note's cross-post to one external network, and the job that makes it.
 
-    We persist enough information to render a link later even if the user changes
-    their instance / handle. Status is simple for now (success/error) and can be
-    expanded with retry metadata later.
+    Rows start out ``pending`` when the note is published and are picked up by
+    the crosspost workers (accounts.crosspost), which retry failures with
+    exponential backoff until they succeed or run out of attempts (``error``).
+    We persist enough information to render a link later even if the user
+    changes their instance / handle.
     """
     NETWORK_CHOICES = [
         ("mastodon", "Mastodon"),
         ("bluesky", "Bluesky"),
+        ("status_cafe", "Status.cafe"),
     ]
+    PENDING = "pending"
+    SUCCESS = "success"
+    ERROR = "error"
 
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="crossposts")
     network = models.CharField(max_length=20, choices=NETWORK_CHOICES)
     remote_id = models.CharField(max_length=200, blank=True)  # e.g. status ID or URI
     remote_url = models.URLField(max_length=500, blank=True)  # canonical URL to view
-    # Legacy fields (status/error) retained; now a row's existence implies success.
-    status = models.CharField(max_length=20, default="success", db_index=True)
+    status = models.CharField(max_length=20, default=SUCCESS, db_index=True)
     error = models.CharField(max_length=300, blank=True)
+    # Retry bookkeeping for pending rows. A worker that claims a row pushes
+    # next_attempt_at out by a lease, so a row whose worker died is retried.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    face = models.CharField(max_length=8, blank=True)  # status.cafe emoji chosen for the note
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -89,6 +278,11 @@ class NoteCrosspost(models.Model):
         ]
         indexes = [
             models.Index(fields=["network", "status"]),
+            models.Index(
+                fields=["network", "next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="crosspost_pending_idx",
+            ),
         ]
 
     def mark_success(self, remote_id: str | None = None, remote_url: str | None = None):  # pragma: no cover - trivial
@@ -96,14 +290,17 @@ class NoteCrosspost(models.Model):
             self.remote_id = remote_id
         if remote_url:
             self.remote_url = remote_url
-        self.status = "success"
+        self.status = self.SUCCESS
         self.error = ""
-        self.save(update_fields=["remote_id", "remote_url", "status", "error", "updated_at"])
+        self.next_attempt_at = None
+        self.save(update_fields=["remote_id", "remote_url", "status", "error", "next_attempt_at", "updated_at"])
 
-    def mark_error(self, message: str):  # retained for backward compatibility (unused now)
-        self.status = "error"
+    def mark_error(self, message: str, retry_at: datetime.datetime | None = None):
+        """Record a failed attempt; retry at ``retry_at``, or give up when it's None."""
+        self.status = self.PENDING if retry_at else self.ERROR
         self.error = (message or "")[:300]
-        self.save(update_fields=["status", "error", "updated_at"])
+        self.next_attempt_at = retry_at
+        self.save(update_fields=["status", "error", "next_attempt_at", "updated_at"])
 
     def __str__(self) -> str:  # pragma: no cover - trivial
         nid = getattr(self.note, 'id', None)
@@ -0,0 +1,64 @@
+"""Full-response cache for anonymous visitors.
+
+Anonymous GETs of the home and about pages are identical for everyone, except
+for the CSRF token in the note form. Pages served through this cache render a
+blank token field instead, which the base template's script fills from the
+``csrftoken`` cookie (fetching ``/csrf/`` first if the cookie is missing). That
+keeps the markup shareable, so a reverse proxy can serve it as well.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .feed_cache import feed_version
+
+
+def _is_shareable(request) -> bool:
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.GET
+        and not request.user.is_authenticated
+        # Pending flash messages are per-visitor.
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(view):
+    """Serve (and store) the full response for anonymous visitors from the cache.
+
+    Keys include the feed version, so publishing or deleting a note refreshes the
+    cached pages along with the feed fragment. Authenticated users bypass the
+    cache and get a private response.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_shareable(request):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+
+        key = f"page:{request.path}:{feed_version()}"
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            # Tells the templates to leave the CSRF token for the client to fill in.
+            request.shared_page_cache = True
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, (response.content, response["Content-Type"]), timeout=settings.FEED_CACHE_SECONDS)
+
+        # Browsers always revalidate (so a visitor sees their own note right after
+        # posting); shared caches may keep the page for a short while.
+        patch_cache_control(response, public=True, max_age=0, s_maxage=settings.ANON_PAGE_CACHE_SECONDS)
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+    return wrapper
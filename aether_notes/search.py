@@ -0,0 +1,76 @@
+"""Full-text search over notes, backed by the ``aether_notes_note_fts`` FTS5 index
+(migration 0017).
+
+User input is never passed to MATCH as-is: it is reduced to its words, each
+quoted, so punctuation can't form FTS5 query syntax. Every word must match and
+the last one also matches as a prefix, which suits search-as-you-type.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Note
+from .pagination import InvalidCursor
+
+FTS_TABLE = "aether_notes_note_fts"
+MAX_TERMS = 8
+
+
+def fts_query(text: str) -> str | None:
+    """Turn free text into a safe FTS5 query, or None if it has no words."""
+    terms = re.findall(r"\w+", text or "")[:MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def matching_note_ids(text: str) -> RawSQL | None:
+    """Subquery of the ids of notes matching ``text``, for ``pk__in=`` filters."""
+    query = fts_query(text)
+    if query is None:
+        return None
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+
+
+def encode_rank_cursor(score: float, pk: int) -> str:
+    return f"{score!r}~{pk}"
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        score, pk = cursor.split("~", 1)
+        return float(score), int(pk)
+    except ValueError as e:
+        raise InvalidCursor(cursor) from e
+
+
+def search_user_notes(user_id: int, text: str, cursor: str | None, size: int) -> tuple[list[int], str | None]:
+    """Rank a user's published notes against ``text``; returns ``(note_ids, next_cursor)``.
+
+    Best matches (lowest bm25) first, ties newest first. Like pagination.keyset_page,
+    the cursor is the last row of the previous page, so later pages cost the same.
+    Raises InvalidCursor for garbage input.
+    """
+    query = fts_query(text)
+    if query is None:
+        return [], None
+    note_table = connection.ops.quote_name(Note._meta.db_table)
+    params = [query, user_id]
+    after = ""
+    if cursor:
+        score, pk = decode_rank_cursor(cursor)
+        after = f"AND (bm25({FTS_TABLE}) > %s OR (bm25({FTS_TABLE}) = %s AND n.id < %s))"
+        params += [score, score, pk]
+    sql = (
+        f"SELECT n.id, bm25({FTS_TABLE}) FROM {FTS_TABLE} JOIN {note_table} AS n ON n.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND n.user_id = %s AND NOT n.is_draft {after} "
+        f"ORDER BY bm25({FTS_TABLE}), n.id DESC LIMIT %s"
+    )
+    with connection.cursor() as c:
+        c.execute(sql, [*params, size + 1])
+        rows = c.fetchall()
+    if len(rows) > size:
+        rows = rows[:size]
+        return [pk for pk, _ in rows], encode_rank_cursor(rows[-1][1], rows[-1][0])
+    return [pk for pk, _ in rows], None
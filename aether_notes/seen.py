@@ -0,0 +1,54 @@
+"""Per-process memory of recent (note_id, device_id) witness pairs.
+
+A device that lost its local "seen" markers (cleared storage, new browser) keeps
+re-sending witnesses for notes it already counted. Pairs recorded here are
+answered without a database round trip. It's a bounded LRU whose entries expire
+when their note leaves the feed window (pub_date + FEED_WINDOW); pairs for older
+notes (archive pages) aren't kept, so they can't push out live ones. On a miss
+the database stays the source of truth.
+"""
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .feed_cache import FEED_WINDOW
+
+
+class SeenSet:
+    def __init__(self, max_size: int, window: datetime.timedelta):
+        self.max_size = max_size
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[int, uuid.UUID], float] = OrderedDict()
+
+    def __contains__(self, key: tuple[int, uuid.UUID]) -> bool:
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: tuple[int, uuid.UUID], pub_date: datetime.datetime) -> None:
+        """Remember the pair until the note (published at ``pub_date``) leaves the feed."""
+        expires = (pub_date + self.window).timestamp()
+        if self.max_size <= 0 or expires <= time.time():
+            return
+        with self._lock:
+            self._entries[key] = expires
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+seen_views = SeenSet(settings.WITNESS_SEEN_CACHE_SIZE, FEED_WINDOW)
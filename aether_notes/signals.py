@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from .feed_cache import bump_feed_version
+from .live import hub
+from .models import Note, NoteCrosspost
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_feed_on_note_change(sender, instance: Note, **kwargs):
+    # Drafts never appear in the feed, so editing them doesn't invalidate it.
+    if instance.is_draft:
+        return
+    transaction.on_commit(bump_feed_version)
+
+
+@receiver(post_save, sender=NoteCrosspost)
+@receiver(post_delete, sender=NoteCrosspost)
+def invalidate_feed_on_crosspost_change(sender, instance: NoteCrosspost, **kwargs):
+    transaction.on_commit(bump_feed_version)
+
+
+def _publish_note(note_id: int) -> None:
+    note = (
+        Note.objects.filter(pk=note_id, is_draft=False)
+        .with_author_card()
+        .with_crossposts()
+        .first()
+    )
+    if note is None:
+        return
+    html = render_to_string("aether_notes/_note_cards.html", {"notes": [note]})
+    hub.publish("note", {"id": note.pk, "html": html})
+
+
+@receiver(post_save, sender=Note)
+def publish_note_live(sender, instance: Note, **kwargs):
+    # Rendering is skipped entirely when nobody is listening (e.g. under WSGI).
+    if instance.is_draft or not hub.has_subscribers:
+        return
+    transaction.on_commit(partial(_publish_note, instance.pk))
+
+
+@receiver(post_delete, sender=Note)
+def publish_note_deleted_live(sender, instance: Note, **kwargs):
+    if instance.is_draft or not hub.has_subscribers:
+        return
+    transaction.on_commit(partial(hub.publish, "delete", {"id": instance.pk}))
@@ -0,0 +1,44 @@
+"""HyperLogLog: an approximate count of distinct device ids in a fixed 1 KiB.
+
+Used to remember who witnessed an archived note after its NoteView rows are
+compacted away (see ``aether_notes.maintenance``). Counts below a couple of
+thousand are close to exact; above that the standard error is about 3%.
+"""
+import hashlib
+import math
+
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+_REST_BITS = 64 - PRECISION
+
+
+class HyperLogLog:
+    def __init__(self, registers: bytes | None = None):
+        self.registers = bytearray(registers) if registers else bytearray(REGISTERS)
+        if len(self.registers) != REGISTERS:
+            raise ValueError(f"expected {REGISTERS} registers, got {len(self.registers)}")
+
+    def add(self, value: bytes) -> bool:
+        """Add ``value``; returns False if the sketch already accounted for it."""
+        h = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+        index = h >> _REST_BITS
+        rest = h & ((1 << _REST_BITS) - 1)
+        # Position of the first 1 bit after the index bits.
+        rank = _REST_BITS - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def estimate(self) -> int:
+        m = REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting).
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
@@ -1,3 +1,958 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import closing
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import constants as message_levels
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.sessions.models import Session
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpRequest
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from accounts.models import Profile
+from accounts.views import _archive_notes
+from aether.routers import replica_reads
+
+from .counters import CounterBuffer
+from .management.commands import refresh_replica
+from .feed_cache import FEED_WINDOW, build_feed_html, bump_feed_version, feed_queryset, feed_version, get_feed_html
+from .fields import DeviceIdField
+from .live import hub
+from .maintenance import compact_counter_details, sweep_expired_notes
+from .models import Note, NoteCrosspost, NoteFlag, NoteView, NoteViewSketch
+from .pagination import keyset_filter
+from .search import matching_note_ids, search_user_notes
+from .seen import SeenSet
+from .sketch import HyperLogLog
+from .writer import Writer, WriteQueueTimeout, run_write
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    """The feed fragment is rendered once per version; changing a note moves to a new one."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fragment_is_reused_until_a_note_changes(self):
+        Note.objects.create(text="first note", pub_date=timezone.now())
+        html = get_feed_html()
+        self.assertIn("first note", html)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed_html(), html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(text="second note", pub_date=timezone.now())
+        self.assertIn("second note", get_feed_html())
+
+    def test_drafts_do_not_invalidate(self):
+        Note.objects.create(text="published", pub_date=timezone.now())
+        html = get_feed_html()
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(text="a draft", pub_date=timezone.now(), is_draft=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed_html(), html)
+
+
+class FeedFragmentTimeTests(TestCase):
+    """The cached fragment carries publish times, so it doesn't go stale as the clock moves."""
+
+    def test_fragment_does_not_depend_on_the_current_time(self):
+        note = Note.objects.create(text="fading", pub_date=timezone.now() - datetime.timedelta(hours=1))
+        html = build_feed_html()
+        self.assertIn(f'data-pub-ts="{int(note.pub_date.timestamp())}"', html)
+        self.assertNotIn("opacity", html)
+        later = timezone.now() + datetime.timedelta(hours=6)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(build_feed_html(), html)
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Anonymous visitors share one cached copy of the home page; everyone else bypasses it."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_shared_page_has_no_cookie_or_token(self):
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.cookies)  # no Set-Cookie
+        self.assertContains(response, '<input type="hidden" name="csrfmiddlewaretoken" value="" data-csrf-from-cookie>')
+        self.assertEqual(
+            set(response["Cache-Control"].split(", ")),
+            {"public", "max-age=0", f"s-maxage={settings.ANON_PAGE_CACHE_SECONDS}"},
+        )
+        self.assertIn("Cookie", response["Vary"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("index")).content, response.content)
+
+    def test_signed_in_visitors_bypass_the_cache(self):
+        self.client.get(reverse("index"))  # fills the shared copy
+        self.client.force_login(User.objects.create(username="member"))
+        response = self.client.get(reverse("index"))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotContains(response, 'value="" data-csrf-from-cookie')
+        self.assertRegex(response.content.decode(), r'name="csrfmiddlewaretoken" value="[^"]+"')
+
+    def test_pending_messages_bypass_the_cache(self):
+        self.client.get(reverse("index"))
+        storage = CookieStorage(HttpRequest())
+        self.client.cookies["messages"] = storage._encode([Message(message_levels.ERROR, "only for you")])
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "only for you")
+        self.assertIn("private", response["Cache-Control"])
+        # The message was consumed; the shared copy never saw it.
+        self.assertNotContains(self.client.get(reverse("index")), "only for you")
+
+    def test_feed_version_bump_refreshes_the_page(self):
+        self.client.get(reverse("index"))
+        Note.objects.create(text="fresh note", pub_date=timezone.now())  # on_commit bump not run
+        self.assertNotContains(self.client.get(reverse("index")), "fresh note")
+        bump_feed_version()
+        self.assertContains(self.client.get(reverse("index")), "fresh note")
+
+    def test_csrf_cookie_endpoint_gives_a_token_posts_accept(self):
+        client = Client(enforce_csrf_checks=True)
+        page = client.get(reverse("index"))
+        self.assertContains(page, reverse("csrf_cookie"))  # the fill script calls it when the cookie is missing
+        self.assertNotIn(settings.CSRF_COOKIE_NAME, client.cookies)
+        self.assertEqual(client.get(reverse("csrf_cookie")).status_code, 204)
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value  # what the script copies into the form
+
+        self.assertEqual(client.post(reverse("create_note"), {"text": "no token"}).status_code, 403)
+        response = client.post(reverse("create_note"), {"text": "with token", "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Note.objects.filter(text="with token").exists())
+
+
+@override_settings(FEED_PAGE_SIZE=2)
+class FeedPaginationTests(TestCase):
+    """Infinite scroll walks the feed by (pub_date, id) cursors."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_cover_notes_sharing_a_timestamp_exactly_once(self):
+        now = timezone.now()
+        for i in range(5):
+            Note.objects.create(text=f"paged-{i}", pub_date=now)
+        page = self.client.get(reverse("index")).content.decode()
+        seen = re.findall(r"paged-\d", page)
+        cursor = re.search(r'data-next-cursor="([^"]+)"', page).group(1)
+        while cursor:
+            data = self.client.get(reverse("feed_page"), {"cursor": cursor}).json()
+            self.assertTrue(data["ok"])
+            seen += re.findall(r"paged-\d", data["html"])
+            cursor = data["next"]
+        self.assertEqual(sorted(seen), [f"paged-{i}" for i in range(5)])
+
+    def test_last_page_has_no_cursor(self):
+        now = timezone.now()
+        first = Note.objects.create(text="older", pub_date=now - datetime.timedelta(minutes=1))
+        Note.objects.create(text="newer", pub_date=now)
+        Note.objects.create(text="newest", pub_date=now + datetime.timedelta(minutes=1))
+        page = self.client.get(reverse("index")).content.decode()
+        cursor = re.search(r'data-next-cursor="([^"]+)"', page).group(1)
+        data = self.client.get(reverse("feed_page"), {"cursor": cursor}).json()
+        self.assertIn(first.text, data["html"])
+        self.assertIsNone(data["next"])
+
+    def test_bad_cursors_are_rejected(self):
+        for cursor in ("garbage", "12.x", "1.2.3", f"{10**30}.1"):
+            response = self.client.get(reverse("feed_page"), {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json()["error"], "invalid_cursor")
+        response = self.client.get(reverse("feed_page"))
+        self.assertEqual(response.json()["error"], "missing_cursor")
+
+
+class IndexQueryCountTests(TestCase):
+    """Rendering the feed costs the same number of queries however many notes it shows."""
+
+    # One query for the notes (authors and their profile cards joined in) and one
+    # prefetch for crossposts.
+    EXPECTED_QUERIES = 2
+
+    def setUp(self):
+        cache.clear()
+
+    def _make_notes(self, count):
+        now = timezone.now()
+        for i in range(count):
+            user = None
+            if i % 2:
+                user = User.objects.create(username=f"author{Note.objects.count()}")
+                user.profile.show_archive = bool(i % 3)
+                user.profile.website = "https://example.com"
+                user.profile.mastodon_token = "secret"
+                user.profile.save()
+            note = Note.objects.create(text=f"note {i} https://example.com", pub_date=now - datetime.timedelta(minutes=i), user=user)
+            if i % 4 == 0:
+                NoteCrosspost.objects.create(note=note, network="mastodon", remote_url="https://example.com/@a/1")
+
+    def _assert_index_queries(self):
+        cache.clear()
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_notes(self):
+        self._make_notes(1)
+        self._assert_index_queries()
+
+        self._make_notes(20)
+        response = self._assert_index_queries()
+        self.assertContains(response, "note 19")
+
+    def test_author_card_is_rendered_without_loading_secrets(self):
+        self._make_notes(2)
+        note = Note.objects.filter(user__isnull=False).with_author_card().get()
+        deferred = note.user.profile.get_deferred_fields()
+        self.assertIn("mastodon_token", deferred)
+        self.assertIn("bluesky_app_password", deferred)
+        self.assertIn("status_cafe_password", deferred)
+
+        response = self._assert_index_queries()
+        self.assertContains(response, note.user.username)
+
+
+class NoteHtmlTests(TestCase):
+    """Note.text_html is rendered on save and backfilled for older rows."""
+
+    def test_editing_text_rerenders_html(self):
+        note = Note.objects.create(text="see https://example.com", pub_date=timezone.now())
+        self.assertIn('<a href="https://example.com"', note.text_html)
+
+        note.text = "line one\nline <two>"
+        note.save(update_fields=["text"])
+        note.refresh_from_db()
+        self.assertEqual(note.text_html, "line one<br>line &lt;two&gt;")
+
+    def test_rendered_text_falls_back_when_html_is_missing(self):
+        note = Note.objects.create(text="a <b>\nb", pub_date=timezone.now())
+        Note.objects.filter(pk=note.pk).update(text_html="")
+        note.refresh_from_db()
+        self.assertEqual(note.rendered_text, "a &lt;b&gt;<br>b")
+        self.assertEqual(Note(text="", text_html="").rendered_text, "")
+
+    def test_backfill_fills_only_empty_rows_and_is_idempotent(self):
+        kept = Note.objects.create(text="kept", pub_date=timezone.now())
+        Note.objects.filter(pk=kept.pk).update(text_html="custom")
+        stale = Note.objects.create(text="a\nb", pub_date=timezone.now())
+        Note.objects.filter(pk=stale.pk).update(text_html="")
+
+        out = StringIO()
+        call_command("backfill_note_html", batch_size=1, stdout=out)
+        self.assertIn("Rendered 1 note(s).", out.getvalue())
+        stale.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertEqual(stale.text_html, "a<br>b")
+        self.assertEqual(kept.text_html, "custom")
+
+        out = StringIO()
+        call_command("backfill_note_html", batch_size=1, stdout=out)
+        self.assertIn("Rendered 0 note(s).", out.getvalue())
+
+
+class LiveFeedTests(TransactionTestCase):
+    """Under ASGI the page subscribes to /live/, which streams notes as they're published."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_wsgi_pages_skip_the_live_stream(self):
+        self.assertNotContains(self.client.get(reverse("index")), reverse("live_feed"))
+        self.assertEqual(self.client.get(reverse("live_feed")).status_code, 204)
+
+    async def test_asgi_page_subscribes(self):
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, f"new EventSource('{reverse('live_feed')}')")
+
+    async def test_hub_fans_out_to_open_subscriptions(self):
+        async with hub.subscribe() as first, hub.subscribe() as second:
+            await sync_to_async(hub.publish)("delete", {"id": 7})
+            for queue in (first, second):
+                self.assertEqual(await asyncio.wait_for(queue.get(), timeout=5), 'event: delete\ndata: {"id": 7}\n\n')
+        self.assertFalse(hub.has_subscribers)
+
+    async def test_published_note_is_streamed(self):
+        # Drive the real ASGI handler so the stream ends the way it does in
+        # production: the client disconnects and the response task is cancelled.
+        sent, received = asyncio.Queue(), asyncio.Queue()
+        received.put_nowait({"type": "http.request", "body": b"", "more_body": False})
+
+        async def next_frame():
+            while (message := await asyncio.wait_for(sent.get(), timeout=5))["type"] != "http.response.body":
+                self.assertEqual(message["status"], 200)
+            return message["body"].decode()
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": reverse("live_feed"),
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+        }
+        request = asyncio.ensure_future(get_asgi_application()(scope, received.get, sent.put))
+        try:
+            self.assertEqual(await next_frame(), f"retry: {settings.LIVE_RETRY_MS}\n\n")
+            while not hub.has_subscribers:
+                await asyncio.sleep(0.01)
+            await sync_to_async(Note.objects.create)(text="pushed live", pub_date=timezone.now(), is_draft=True)
+            note = await sync_to_async(Note.objects.create)(text="pushed live", pub_date=timezone.now())
+            event, data = (await next_frame()).split("\n")[:2]
+        finally:
+            received.put_nowait({"type": "http.disconnect"})
+            await asyncio.wait_for(request, timeout=5)
+        self.assertEqual(event, "event: note")  # the draft published nothing
+        payload = json.loads(data.removeprefix("data: "))
+        self.assertEqual(payload["id"], note.pk)
+        self.assertIn("pushed live", payload["html"])
+        self.assertFalse(hub.has_subscribers)
+
+
+class WitnessBatchTests(TestCase):
+    """One batch records every unseen note for a device in a single request."""
+
+    def test_mixed_batch_counts_only_new_views_of_existing_notes(self):
+        device_id = uuid.uuid4()
+        new = Note.objects.create(text="new to this device", pub_date=timezone.now())
+        repeat = Note.objects.create(text="seen before", pub_date=timezone.now(), views=1)
+        NoteView.objects.create(note=repeat, device_id=device_id)
+
+        url = reverse("witness_batch")
+        note_ids = f"{new.pk},{repeat.pk},{new.pk},999999"
+        response = self.client.post(url, {"device_id": str(device_id), "note_ids": note_ids})
+        self.assertEqual(response.json(), {"ok": True, "views": {str(new.pk): 1, str(repeat.pk): 1}})
+        self.assertEqual(NoteView.objects.filter(device_id=device_id).count(), 2)
+
+        # Sending the same batch again changes nothing.
+        response = self.client.post(url, {"device_id": str(device_id), "note_ids": note_ids})
+        self.assertEqual(response.json()["views"], {str(new.pk): 1, str(repeat.pk): 1})
+
+    @override_settings(WITNESS_BATCH_MAX=2)
+    def test_invalid_payloads_are_rejected(self):
+        url = reverse("witness_batch")
+        for payload, error in (
+            ({"device_id": str(uuid.uuid4()), "note_ids": "1,abc"}, "invalid_payload"),
+            ({"device_id": str(uuid.uuid4()), "note_ids": ""}, "missing_fields"),
+            ({"device_id": "", "note_ids": "1"}, "missing_fields"),
+            ({"device_id": str(uuid.uuid4()), "note_ids": "1,2,3"}, "too_many"),
+            ({"device_id": "not-a-uuid", "note_ids": "1"}, "invalid_device_id"),
+        ):
+            with self.subTest(error=error):
+                response = self.client.post(url, payload)
+                self.assertEqual((response.status_code, response.json()["error"]), (400, error))
+
+
+class CounterStatementTests(TestCase):
+    """NoteView.record and NoteFlag.toggle keep the note's counters in step with the rows."""
+
+    def setUp(self):
+        self.note = Note.objects.create(text="counted", pub_date=timezone.now())
+        self.device_id = uuid.uuid4()
+
+    def test_record_is_idempotent(self):
+        views, created, pub_date = NoteView.record(self.note.pk, self.device_id)
+        self.assertEqual((views, created, pub_date), (1, True, self.note.pub_date))
+        self.assertEqual(NoteView.record(self.note.pk, self.device_id)[:2], (1, False))
+        self.assertEqual(NoteView.record(self.note.pk, uuid.uuid4())[:2], (2, True))
+        self.assertEqual(NoteView.objects.filter(note=self.note).count(), 2)
+        self.assertEqual(NoteView.record(999999, self.device_id), (None, False, None))
+
+    def test_toggle_round_trip(self):
+        self.assertEqual(NoteFlag.toggle(self.note.pk, self.device_id), (1, True))
+        self.assertTrue(NoteFlag.objects.filter(note=self.note, device_id=self.device_id).exists())
+        self.assertEqual(NoteFlag.toggle(self.note.pk, self.device_id), (0, False))
+        self.assertFalse(NoteFlag.objects.filter(note=self.note).exists())
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.flags, 0)
+        self.assertEqual(NoteFlag.toggle(999999, self.device_id), (None, False))
+
+
+class DeviceIdFieldTests(TestCase):
+    """Device ids are normalised to a UUID and stored as its 16 bytes."""
+
+    DEVICE = uuid.UUID("0b9c3a2e-6b1f-4c1e-8d6a-3f2e1d0c9b8a")
+
+    def test_spellings_of_one_id_prepare_to_the_same_bytes(self):
+        field = DeviceIdField()
+        for value in (
+            str(self.DEVICE).upper(),
+            self.DEVICE.hex,
+            f"  {self.DEVICE}  ",
+            self.DEVICE.bytes,
+            self.DEVICE,
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(field.to_python(value), self.DEVICE)
+                self.assertEqual(field.get_prep_value(value), self.DEVICE.bytes)
+
+    def test_invalid_ids_raise(self):
+        field = DeviceIdField()
+        for value in ("legacy-device", "", b"short"):
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                field.get_prep_value(value)
+        self.assertIsNone(field.get_prep_value(None))
+        self.assertIsNone(field.to_python(None))
+
+
+class DeviceIdMigrationTests(TransactionTestCase):
+    """Migration 0014 converts legacy text ids to bytes and back."""
+
+    before = [("aether_notes", "0013_note_text_html")]
+    after = [("aether_notes", "0014_device_id_binary")]
+    DEVICE = uuid.UUID("0b9c3a2e-6b1f-4c1e-8d6a-3f2e1d0c9b8a")
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _raw(self, table, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM {table} ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_legacy_ids_round_trip(self):
+        apps = self._migrate(self.before)
+        OldNote = apps.get_model("aether_notes", "Note")
+        OldNoteView = apps.get_model("aether_notes", "NoteView")
+        note = OldNote.objects.create(text="legacy", pub_date=timezone.now(), created_device_id="legacy-device")
+        OldNote.objects.create(text="no creator", pub_date=timezone.now(), created_device_id="")
+        OldNoteView.objects.create(note=note, device_id=str(self.DEVICE))
+        OldNoteView.objects.create(note=note, device_id=str(self.DEVICE).upper())  # same device, other spelling
+        OldNoteView.objects.create(note=note, device_id="legacy-device")
+
+        self._migrate(self.after)
+        namespace = importlib.import_module("aether_notes.migrations.0014_device_id_binary").LEGACY_DEVICE_NAMESPACE
+        legacy = uuid.uuid5(namespace, "legacy-device")
+        self.assertEqual(self._raw("aether_notes_note", "created_device_id"), [legacy.bytes, None])
+        self.assertEqual(
+            sorted(self._raw("aether_notes_noteview", "device_id")), sorted([self.DEVICE.bytes, legacy.bytes])
+        )
+
+        self._migrate(self.before)
+        self.assertEqual(self._raw("aether_notes_note", "created_device_id"), [str(legacy), None])
+        self.assertEqual(
+            sorted(self._raw("aether_notes_noteview", "device_id")), sorted([str(self.DEVICE), str(legacy)])
+        )
+
+
+class ExpirySweepTests(TestCase):
+    """The sweep deletes notes that left the feed, in paced batches."""
+
+    def test_sweep_deletes_only_expired_published_notes_in_batches(self):
+        old = timezone.now() - FEED_WINDOW - datetime.timedelta(hours=1)
+        expired = [Note.objects.create(text=f"faded {i}", pub_date=old) for i in range(3)]
+        NoteView.objects.create(note=expired[0], device_id=uuid.uuid4())
+        draft = Note.objects.create(text="old draft", pub_date=old, is_draft=True)
+        live = Note.objects.create(text="still in the feed", pub_date=timezone.now())
+        archivist = User.objects.create(username="archivist")
+        Profile.objects.filter(user=archivist).update(show_archive=True)
+        archived = Note.objects.create(text="kept on the archive", pub_date=old, user=archivist)
+
+        with patch("aether_notes.maintenance.time.sleep") as sleep:
+            removed = sweep_expired_notes(batch_size=2, pause=0.5)
+        self.assertEqual(sleep.call_count, 2)  # 3 notes in batches of 2
+        self.assertEqual(removed["aether_notes.Note"], 3)
+        self.assertEqual(removed["aether_notes.NoteView"], 1)
+        self.assertEqual(set(Note.objects.values_list("pk", flat=True)), {draft.pk, live.pk, archived.pk})
+
+
+class HyperLogLogTests(TestCase):
+    """The sketch counts distinct values closely and ignores repeats."""
+
+    def test_estimates_and_repeats(self):
+        hll = HyperLogLog()
+        devices = [i.to_bytes(16, "big") for i in range(5000)]
+        for device in devices[:100]:
+            hll.add(device)
+        self.assertAlmostEqual(hll.estimate(), 100, delta=3)
+        self.assertFalse(any([hll.add(device) for device in devices[:100]]))
+        self.assertAlmostEqual(hll.estimate(), 100, delta=3)
+
+        for device in devices[100:]:
+            hll.add(device)
+        self.assertAlmostEqual(hll.estimate(), 5000, delta=500)
+
+    def test_registers_round_trip(self):
+        hll = HyperLogLog()
+        hll.add(b"device")
+        self.assertEqual(HyperLogLog(hll.to_bytes()).estimate(), 1)
+        with self.assertRaises(ValueError):
+            HyperLogLog(b"short")
+
+
+class CounterCompactionTests(TestCase):
+    """Compaction deletes old per-device rows; archived notes keep their viewers in a sketch."""
+
+    def setUp(self):
+        old = timezone.now() - datetime.timedelta(days=30)
+        archivist = User.objects.create(username="keeper")
+        Profile.objects.filter(user=archivist).update(show_archive=True)
+        self.devices = [uuid.uuid4() for _ in range(3)]
+        self.archived = Note.objects.create(text="on the archive", pub_date=old, user=archivist, views=3, flags=1)
+        for device_id in self.devices:
+            NoteView.objects.create(note=self.archived, device_id=device_id)
+        NoteFlag.objects.create(note=self.archived, device_id=self.devices[0])
+        self.anonymous = Note.objects.create(text="old and anonymous", pub_date=old, views=2)
+        for device_id in self.devices[:2]:
+            NoteView.objects.create(note=self.anonymous, device_id=device_id)
+        self.recent = Note.objects.create(text="recent", pub_date=timezone.now(), views=1)
+        NoteView.objects.create(note=self.recent, device_id=self.devices[0])
+
+    def _compact(self, **kwargs):
+        return compact_counter_details(datetime.timedelta(days=7), pause=0, **kwargs)
+
+    def _views(self, note):
+        note.refresh_from_db()
+        return note.views
+
+    def test_old_rows_are_deleted_and_counts_kept(self):
+        totals = self._compact()
+        self.assertEqual(totals, {"notes": 2, "views": 5, "flags": 1, "sketched": 0})
+        self.assertEqual(list(NoteView.objects.values_list("note_id", flat=True)), [self.recent.pk])
+        self.assertFalse(NoteFlag.objects.exists())
+        self.assertFalse(NoteViewSketch.objects.exists())
+        self.assertEqual((self._views(self.archived), self._views(self.anonymous)), (3, 2))
+        self.assertEqual(self._compact()["notes"], 0)
+
+    def test_archived_viewers_fold_into_a_sketch(self):
+        totals = self._compact(sketch_archived=True)
+        self.assertEqual(totals["sketched"], 1)
+        sketch = NoteViewSketch.objects.get()
+        self.assertEqual((sketch.note_id, sketch.base), (self.archived.pk, 0))
+        self.assertEqual(HyperLogLog(sketch.registers).estimate(), 3)
+        self.assertFalse(NoteView.objects.filter(note=self.archived).exists())
+        self.assertEqual(self._views(self.archived), 3)
+
+        # Rows that show up later (a folded device and a new one) merge into the same sketch.
+        NoteView.objects.create(note=self.archived, device_id=self.devices[0])
+        NoteView.objects.create(note=self.archived, device_id=uuid.uuid4())
+        self.assertEqual(self._compact(sketch_archived=True)["sketched"], 1)
+        self.assertEqual(NoteViewSketch.objects.count(), 1)
+        self.assertEqual(self._views(self.archived), 4)
+
+    def test_rewitnessing_a_compacted_note_is_not_counted_again(self):
+        self._compact(sketch_archived=True)
+        url = reverse("witness")
+        response = self.client.post(url, {"note_id": self.archived.pk, "device_id": str(self.devices[1])})
+        self.assertEqual(response.json(), {"ok": True, "already": True, "views": 3})
+        response = self.client.post(url, {"note_id": self.archived.pk, "device_id": str(uuid.uuid4())})
+        self.assertEqual(response.json(), {"ok": True, "views": 4})
+
+        response = self.client.post(
+            reverse("witness_batch"), {"device_id": str(self.devices[2]), "note_ids": str(self.archived.pk)}
+        )
+        self.assertEqual(response.json()["views"], {str(self.archived.pk): 4})
+        CounterBuffer._write({self.archived.pk: {self.devices[0], uuid.uuid4()}}, {})
+        self.assertEqual(self._views(self.archived), 5)
+
+        # Nothing new to fold: the sketch already holds every device.
+        self.assertFalse(NoteView.objects.filter(note=self.archived).exists())
+        self._compact(sketch_archived=True)
+        self.assertEqual(self._views(self.archived), 5)
+
+    def test_command_reports_totals(self):
+        out = StringIO()
+        call_command("compact_counters", days=7, sketch_archived=True, pause=0, stdout=out)
+        self.assertIn("Compacted 2 note(s): removed 5 view and 1 flag row(s), 1 sketch(es) updated.", out.getvalue())
+        self.assertEqual(NoteView.objects.count(), 1)
+
+
+class QueryPlanTests(TestCase):
+    """The hot note queries are answered from their index: no full scan, no sort step."""
+
+    CURSOR = "1760000000000000.42"
+
+    def setUp(self):
+        self.user = User.objects.create(username="planner")
+
+    def assertIndexedPlan(self, qs, index_name):
+        plan = qs.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+        self.assertNotRegex(plan, r"\bSCAN aether_notes_note\b")
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_feed(self):
+        for cursor in (None, self.CURSOR):
+            with self.subTest(cursor=cursor):
+                self.assertIndexedPlan(keyset_filter(feed_queryset(), cursor)[:31], "note_feed_idx")
+
+    def test_archive(self):
+        for cursor in (None, self.CURSOR):
+            with self.subTest(cursor=cursor):
+                self.assertIndexedPlan(keyset_filter(_archive_notes(self.user), cursor)[:31], "note_archive_idx")
+
+    def test_drafts(self):
+        # Same query as views.drafts_list.
+        qs = Note.objects.filter(user=self.user, is_draft=True).order_by("-last_modified")
+        self.assertIndexedPlan(qs, "note_drafts_idx")
+
+
+class NoteSearchTests(TestCase):
+    """The FTS index follows note writes; archive search ranks and pages through matches."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="searcher")
+        self.user.profile.show_archive = True
+        self.user.profile.save()
+
+    def _matches(self, text):
+        return set(Note.objects.filter(pk__in=matching_note_ids(text)).values_list("pk", flat=True))
+
+    def test_sync_triggers_survive_migrations(self):
+        # Migrations that rebuild aether_notes_note drop its triggers (see 0017).
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE name LIKE 'aether_notes_note_fts%'")
+            objects = set(cursor.fetchall())
+        self.assertLessEqual(
+            {
+                ("table", "aether_notes_note_fts"),
+                ("trigger", "aether_notes_note_fts_ai"),
+                ("trigger", "aether_notes_note_fts_ad"),
+                ("trigger", "aether_notes_note_fts_au"),
+            },
+            objects,
+        )
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        note = Note.objects.create(text="Crème brûlée", pub_date=timezone.now())
+        self.assertEqual(self._matches("creme brul"), {note.pk})
+
+        note.text = "tiramisu"
+        note.save()
+        self.assertEqual(self._matches("creme"), set())
+        self.assertEqual(self._matches("tiramisu"), {note.pk})
+
+        note.delete()
+        self.assertEqual(self._matches("tiramisu"), set())
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertIsNone(matching_note_ids('"*( '))
+        self.assertEqual(self._matches('NEAR(moss OR "x"'), set())
+
+    def test_archive_search_pages_through_every_match_once(self):
+        now = timezone.now()
+        for i in range(12):
+            Note.objects.create(text=f"note {i}" + " moss" * (i % 3), pub_date=now, user=self.user)
+        Note.objects.create(text="moss draft", pub_date=now, user=self.user, is_draft=True)
+
+        seen, cursor = search_user_notes(self.user.pk, "moss", None, 3)
+        while cursor:
+            ids, cursor = search_user_notes(self.user.pk, "moss", cursor, 3)
+            seen += ids
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+
+        response = self.client.get(reverse("accounts:user_archive", args=["searcher"]), {"q": "moss"})
+        self.assertContains(response, "moss moss")
+        self.assertNotContains(response, "moss draft")
+
+
+@override_settings(DATABASE_ROUTERS=["aether.routers.ReadReplicaRouter"])
+class ReadRoutingTests(TransactionTestCase):
+    """Only feed/archive note reads use the replica; sessions, users and writes stay on the primary."""
+
+    def test_only_note_reads_in_replica_views_are_routed(self):
+        self.assertEqual(Note.objects.all().db, "default")
+        with replica_reads():
+            self.assertEqual(Note.objects.all().db, "replica")
+            self.assertEqual(NoteCrosspost.objects.all().db, "replica")
+            for model in (Session, User, Profile, NoteView):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(model.objects.all().db, "default")
+            with transaction.atomic():
+                self.assertEqual(Note.objects.all().db, "default")
+
+    def _use_snapshot_replica(self):
+        """Point the replica alias at a snapshot file of the primary; returns its path."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "replica.sqlite3")
+        self._copy_primary(path)
+        replica = DatabaseWrapper(
+            {**connections["default"].settings_dict, "NAME": path, "OPTIONS": {"init_command": "PRAGMA query_only=1;"}},
+            "replica",
+        )
+        connections["replica"] = replica
+        self.addCleanup(connections.__delitem__, "replica")
+        self.addCleanup(replica.close)
+        return path
+
+    @staticmethod
+    def _copy_primary(path):
+        primary = connections["default"]
+        primary.ensure_connection()
+        with closing(sqlite3.connect(path)) as snapshot:
+            primary.connection.backup(snapshot)
+
+    def test_login_with_stale_snapshot_replica(self):
+        # Snapshot the database before the user, their session and their note exist.
+        cache.clear()
+        self._use_snapshot_replica()
+        user = User.objects.create_user("latecomer", password="pw-latecomer")
+        Note.objects.create(text="not in the snapshot", pub_date=timezone.now(), user=user)
+        self.assertTrue(self.client.login(username="latecomer", password="pw-latecomer"))
+
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        # The feed itself came from the (stale) replica.
+        self.assertNotContains(response, "not in the snapshot")
+
+    def test_refreshing_the_snapshot_moves_the_feed_version(self):
+        cache.clear()
+        path = self._use_snapshot_replica()
+
+        # The write bumps the version, but the page is rebuilt from the lagging snapshot.
+        Note.objects.create(text="written after the snapshot", pub_date=timezone.now())
+        response = self.client.get(reverse("index"))
+        self.assertNotContains(response, "written after the snapshot")
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(reverse("index"), headers={"if-none-match": etag}).status_code, 304)
+
+        # The primary here is in memory, so copy it the way the test set the replica up.
+        def snapshot(source, output, pages):
+            self._copy_primary(output)
+
+        with patch.object(refresh_replica.Command, "_snapshot", side_effect=snapshot):
+            call_command("refresh_replica", output=path, stdout=StringIO())
+        response = self.client.get(reverse("index"), headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "written after the snapshot")
+
+
+class SqlitePragmaTests(TestCase):
+    """New connections get the pragmas of SQLITE_PRAGMA_PROFILE."""
+
+    def _pragmas(self, profile, names):
+        with override_settings(SQLITE_PRAGMA_PROFILE=profile):
+            conn = connections.create_connection("default")
+            try:
+                with conn.cursor() as cursor:
+                    return {name: cursor.execute(f"PRAGMA {name};").fetchone()[0] for name in names}
+            finally:
+                conn.close()
+
+    def test_baseline_profile(self):
+        # Only busy_timeout; synchronous keeps SQLite's default (FULL, 2).
+        pragmas = self._pragmas("baseline", ["busy_timeout", "synchronous"])
+        self.assertEqual(pragmas, {"busy_timeout": 5000, "synchronous": 2})
+
+    def test_tuned_profile(self):
+        pragmas = self._pragmas("tuned", ["busy_timeout", "synchronous", "temp_store", "foreign_keys"])
+        # synchronous=NORMAL is 1, temp_store=MEMORY is 2.
+        self.assertEqual(pragmas, {"busy_timeout": 5000, "synchronous": 1, "temp_store": 2, "foreign_keys": 1})
+
+
+class IndexEtagTests(TestCase):
+    """A revalidated home page never reuses a note form with someone else's CSRF token."""
+
+    def test_etag_changes_when_the_csrf_cookie_rotates(self):
+        user = User.objects.create_user("thrower", password="pw-thrower")
+        self.client.force_login(user)
+        self.client.cookies["csrftoken"] = "a" * 32
+        etag = self.client.get(reverse("index"))["ETag"]
+        self.assertEqual(self.client.get(reverse("index"), headers={"if-none-match": etag}).status_code, 304)
+
+        # Logging out and back in rotates the CSRF secret.
+        self.client.logout()
+        self.client.force_login(user)
+        self.client.cookies["csrftoken"] = "b" * 32
+        response = self.client.get(reverse("index"), headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "csrfmiddlewaretoken")
+
+
+class DraftsConditionalGetTests(TestCase):
+    """Deleting an older draft leaves the newest timestamp alone; the ETag must still change."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("drafter", password="pw-drafter")
+        self.client.force_login(self.user)
+        self.older = Note.objects.create(text="deleted note", pub_date=timezone.now(), user=self.user, is_draft=True)
+        Note.objects.create(text="kept note", pub_date=timezone.now(), user=self.user, is_draft=True)
+
+    def test_etag_revalidates_after_a_delete(self):
+        etag = self.client.get(reverse("drafts_list"))["ETag"]
+        self.assertEqual(self.client.get(reverse("drafts_list"), headers={"if-none-match": etag}).status_code, 304)
+        self.older.delete()
+        response = self.client.get(reverse("drafts_list"), headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "deleted note")
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        response = self.client.get(reverse("drafts_list"))
+        self.assertNotIn("Last-Modified", response)
+        self.older.delete()
+        response = self.client.get(reverse("drafts_list"), headers={"if-modified-since": http_date()})
+        self.assertEqual(response.status_code, 200)
+
+
+class CounterBufferTests(TestCase):
+    def test_flag_toggle_when_a_flush_finishes_between_lookups(self):
+        note = Note.objects.create(text="flagged", pub_date=timezone.now())
+        device_id = uuid.uuid4()
+        key = (note.pk, device_id)
+        buffer = CounterBuffer()
+        # A flush is writing the flag: the first lookup sees it in progress...
+        buffer._flushing_flags = {key: True}
+        lookup = buffer._known_flag
+
+        def known_flag(k):
+            value = lookup(k)
+            if buffer._flushing_flags:
+                # ...then the flush commits and clears its snapshot.
+                NoteFlag.objects.create(note=note, device_id=device_id)
+                buffer._flushing_flags = {}
+            return value
+
+        with patch.object(buffer, "_known_flag", side_effect=known_flag), patch.object(buffer, "_ensure_started"):
+            self.assertTrue(buffer.toggle_flag(note.pk, device_id) is False)
+        self.assertEqual(buffer._flags, {key: False})
+
+
+class SeenSetTests(TestCase):
+    """Witness pairs are only remembered while their note is in the feed window."""
+
+    def test_entries_expire_with_the_feed_window(self):
+        seen = SeenSet(10, FEED_WINDOW)
+        device_id = uuid.uuid4()
+        now = timezone.now()
+        seen.add((1, device_id), now - FEED_WINDOW + datetime.timedelta(minutes=1))
+        seen.add((2, device_id), now - FEED_WINDOW - datetime.timedelta(minutes=1))  # archive note
+        self.assertIn((1, device_id), seen)
+        self.assertNotIn((2, device_id), seen)
+        self.assertEqual(len(seen), 1)
+        with patch("aether_notes.seen.time.time", return_value=(now + datetime.timedelta(minutes=2)).timestamp()):
+            self.assertNotIn((1, device_id), seen)
+        self.assertEqual(len(seen), 0)
+
+
+class WriterTests(TransactionTestCase):
+    """The writer thread commits queued writes together and hands each caller its own outcome."""
+
+    def setUp(self):
+        self.writer = Writer()
+        self.busy = threading.Event()
+        self.release = threading.Event()
+        patcher = patch("aether_notes.writer.writer", self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.release.set)
+
+    def _hold_writer(self):
+        """Keep the writer busy so that the next submissions queue up behind it."""
+
+        def hold():
+            self.busy.set()
+            self.release.wait(5)
+
+        future = self.writer.submit(hold)
+        self.assertTrue(self.busy.wait(5))
+        return future
+
+    @staticmethod
+    def _create(text):
+        return Note.objects.create(text=text, pub_date=timezone.now()).text
+
+    @staticmethod
+    def _fail():
+        Note.objects.create(text="rolled back", pub_date=timezone.now())
+        raise ValueError("nope")
+
+    def test_queued_writes_share_a_commit(self):
+        batches = []
+        commit = self.writer._commit
+        with patch.object(self.writer, "_commit", side_effect=lambda jobs: (batches.append(len(jobs)), commit(jobs))):
+            held = self._hold_writer()
+            futures = [
+                self.writer.submit(self._create, "one"),
+                self.writer.submit(self._fail),
+                self.writer.submit(self._create, "two"),
+            ]
+            self.release.set()
+            held.result(5)
+            self.assertEqual(futures[0].result(5), "one")
+            self.assertRaisesMessage(ValueError, "nope", futures[1].result, 5)
+            self.assertEqual(futures[2].result(5), "two")
+        self.assertEqual(batches, [1, 3])
+        # The failing job's savepoint rolled back alone.
+        self.assertEqual(sorted(Note.objects.values_list("text", flat=True)), ["one", "two"])
+
+    @override_settings(WRITE_QUEUE_ENABLED=True)
+    def test_run_write_returns_and_raises_like_a_direct_call(self):
+        self.assertEqual(run_write(self._create, "queued"), "queued")
+        with self.assertRaisesMessage(ValueError, "nope"):
+            run_write(self._fail)
+        self.assertEqual(list(Note.objects.values_list("text", flat=True)), ["queued"])
+
+    @override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_TIMEOUT_SECONDS=0.05)
+    def test_timed_out_write_that_had_not_started_never_runs(self):
+        held = self._hold_writer()
+        with self.assertRaises(WriteQueueTimeout) as caught:
+            run_write(self._create, "too late")
+        self.assertFalse(caught.exception.started)
+        self.release.set()
+        held.result(5)
+        self.assertIs(self.writer.submit(Note.objects.count).result(5), 0)
+
+    @override_settings(WRITE_QUEUE_ENABLED=True)
+    def test_server_timing_and_timeouts_in_responses(self):
+        note = Note.objects.create(text="timed", pub_date=timezone.now())
+        response = self.client.post(reverse("witness"), {"note_id": note.pk, "device_id": str(uuid.uuid4())})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^db-write;dur=[\d.]+;desc="1 write\(s\)"$')
+
+        with patch("aether_notes.views.run_write", side_effect=WriteQueueTimeout(started=True)):
+            response = self.client.post(reverse("witness"), {"note_id": note.pk, "device_id": str(uuid.uuid4())})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"ok": False, "error": "write_pending"})
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class FeedVersionTests(TestCase):
+    def test_tests_use_their_own_version_file(self):
+        self.assertNotEqual(settings.FEED_VERSION_FILE, str(settings.BASE_DIR / "feed.version"))
+
+    def test_version_follows_the_file_mtime(self):
+        version = feed_version()
+        self.assertEqual(feed_version(), version)
+        # A bump from another process (a management command, crosspost_worker)
+        # only shows up here as a newer mtime on the shared file.
+        os.utime(settings.FEED_VERSION_FILE, ns=(version + 1000, version + 1000))
+        self.assertEqual(feed_version(), version + 1000)
+        bump_feed_version()
+        self.assertGreater(feed_version(), version + 1000)
@@ -4,9 +4,13 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("feed/", views.feed_page, name="feed_page"),
+    path("live/", views.live_feed, name="live_feed"),
     path("about/", views.about, name="about"),
+    path("csrf/", views.csrf_cookie, name="csrf_cookie"),
     path("create-note/", views.create_note, name="create_note"),
     path("witness/", views.witness, name="witness"),
+    path("witness/batch/", views.witness_batch, name="witness_batch"),
     path("flag-note/", views.flag_note, name="flag_note"),
     path("delete-note/", views.delete_note, name="delete_note"),
     path("drafts/", views.drafts_list, name="drafts_list"),
@@ -1,19 +1,32 @@
-import datetime
+import asyncio
 
-from django.db import IntegrityError, transaction
-from django.db.models import F
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition, require_GET, require_POST
 
-from django.contrib.auth import get_user_model
 from django.contrib import messages
-from accounts.utils import rate_limited
-from accounts.social import post_selected_networks_async
-
-from .models import Note, NoteFlag, NoteView
+from aether.routers import use_replica
+from accounts.usernames import is_username_taken
+from accounts.utils import make_etag, rate_limited, viewer_key
+from accounts.crosspost import enqueue_crossposts
+
+from . import counters
+from .feed_cache import FEED_WINDOW, bump_feed_version, feed_version, get_feed_html, get_feed_page
+from .fields import parse_device_id
+from .live import hub
+from .models import Note, NoteFlag, NoteView, NoteViewSketch
+from .page_cache import cache_anonymous_page
+from .pagination import InvalidCursor
+from .seen import seen_views
+from .writer import run_write
 from django.contrib.auth.decorators import login_required
 from django.http import Http404
 
@@ -36,7 +49,7 @@ def _save_and_maybe_crosspost(note, text, user, request, *, as_draft=False):
     else:
         note.is_draft = False
         note.pub_date = timezone.now()
-    note.save()
+    run_write(note.save)
 
     # When publishing, mirror create_note's crosspost behavior
     if not as_draft and user and hasattr(user, "profile"):
@@ -48,20 +61,29 @@ def _save_and_maybe_crosspost(note, text, user, request, *, as_draft=False):
 
         if any([want_masto, want_bsky, want_status_cafe]):
             try:
-                post_selected_networks_async(
+                enqueue_crossposts(
+                    note,
                     prof,
-                    note.text,
                     want_masto=want_masto,
                     want_bluesky=want_bsky,
                     want_status_cafe=want_status_cafe,
                     status_cafe_face=status_cafe_face,
-                    note=note,
                 )
             except Exception:
                 # Defensive: don't let crosspost failures block the request
                 pass
 
+def _drafts_etag(request):
+    # No Last-Modified: deleting an older draft leaves the newest timestamp as
+    # it was, so only the count in the ETag notices.
+    state = Note.objects.filter(user=request.user, is_draft=True).aggregate(
+        latest=Max("last_modified"), count=Count("pk")
+    )
+    return make_etag("drafts", viewer_key(request), state["count"], state["latest"])
+
+
 @login_required
+@condition(etag_func=_drafts_etag)
 def drafts_list(request):
     """List drafts for the authenticated user."""
     drafts = Note.objects.filter(user=request.user, is_draft=True).order_by("-last_modified")
@@ -87,37 +109,80 @@ def edit_draft(request, pk):
             _save_and_maybe_crosspost(draft, text, request.user, request, as_draft=False)
             return redirect("index")
         else:
-            draft.save()
+            run_write(draft.save)
             return render(request, "aether_notes/edit_draft.html", {"draft": draft, "saved": True})
 
     return render(request, "aether_notes/edit_draft.html", {"draft": draft})
 
-def index(request):
-    now = timezone.now()
-    cutoff = now - datetime.timedelta(days=2)
-    qs = Note.objects.filter(pub_date__gte=cutoff, is_draft=False).order_by("-pub_date").prefetch_related("crossposts")
-    notes = list(qs[:200])
-
-    # Attach display metadata for fading and expiry labels
-    max_age = 2 * 24 * 3600
-    for n in notes:
-        age = (now - n.pub_date).total_seconds()
-        ratio = min(max(age / max_age, 0.0), 1.0)
-        # Map to opacity: newer -> 1.0, oldest (48h) -> 0.4
-        n.opacity = round(1.0 - 0.6 * ratio, 3)
-        remaining = max(0, int(max_age - age))
-        hours = remaining // 3600
-        minutes = (remaining % 3600) // 60
-        n.expires_in = f"{hours}h {minutes}m"
+def _index_etag(request):
+    # Pending flash messages are one-off; always render those.
+    if len(messages.get_messages(request)):
+        return None
+    return make_etag("index", feed_version(), viewer_key(request))
+
 
+@use_replica
+@condition(etag_func=_index_etag)
+@cache_anonymous_page
+def index(request):
+    # Nothing here depends on the current time; the page script fades cards
+    # and counts down their expiry from each note's publish timestamp.
     context = {
-        "latest_note_list": notes,
-        "now_ts": int(now.timestamp()),
-        "cutoff_ts": int(cutoff.timestamp()),
+        "feed_html": get_feed_html(),
+        "feed_window_seconds": int(FEED_WINDOW.total_seconds()),
+        "witness_batch_max": settings.WITNESS_BATCH_MAX,
+        # Only ASGI serves /live/; under WSGI the page skips the EventSource request.
+        "live_updates": isinstance(request, ASGIRequest),
     }
     return render(request, "aether_notes/index.html", context)
 
 
+@use_replica
+@require_GET
+def feed_page(request):
+    """Next page of the feed for infinite scroll.
+
+    Expects ?cursor=<next cursor of the previous page>.
+    Returns JSON { ok, html, next } where next is null on the last page.
+    """
+    cursor = (request.GET.get("cursor") or "").strip()
+    if not cursor:
+        return JsonResponse({"ok": False, "error": "missing_cursor"}, status=400)
+    try:
+        page = get_feed_page(cursor)
+    except InvalidCursor:
+        return JsonResponse({"ok": False, "error": "invalid_cursor"}, status=400)
+    return JsonResponse({"ok": True, "html": page["html"], "next": page["next"]})
+
+
+@require_GET
+async def live_feed(request):
+    """Server-Sent Events stream of newly published notes and deletions.
+
+    Events: ``note`` ({id, html} with the rendered card) and ``delete`` ({id}).
+    Only streamed under ASGI, where an open connection costs a coroutine rather
+    than a worker thread; under WSGI it answers 204, which tells EventSource
+    not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def stream():
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        async with hub.subscribe() as queue:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=settings.LIVE_HEARTBEAT_SECONDS)
+                except TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream.
+                    yield ": keepalive\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @rate_limited("create_note", limit=2, window_seconds=60)
 def create_note(request):
     print("DEBUG: create_note view called, method =", request.method)
@@ -128,7 +193,8 @@ def create_note(request):
     if not text:
         return redirect(reverse("index"))
 
-    created_device_id = (request.POST.get("device_id") or "").strip() or None
+    # Optional: a missing or malformed id only means the device can't delete it later.
+    created_device_id = parse_device_id(request.POST.get("device_id") or None)
 
     # Check if saving as draft
     save_as_draft = "save_draft" in request.POST
@@ -143,8 +209,7 @@ def create_note(request):
         user = None
         # Reject reserved usernames (registered accounts)
         if raw_author:
-            User = get_user_model()
-            if User.objects.filter(username__iexact=raw_author).exists():
+            if is_username_taken(raw_author):
                 messages.error(request, "Reserved username. Sign in to use it.")
                 return redirect(reverse("index"))
 
@@ -174,10 +239,19 @@ def create_note(request):
     return redirect(reverse("index"))
 
 
+@cache_anonymous_page
 def about(request):
     return render(request, "aether_notes/about.html")
 
 
+@require_GET
+@never_cache
+@ensure_csrf_cookie
+def csrf_cookie(request):
+    """Set the CSRF cookie for pages served from a shared cache (see page_cache)."""
+    return HttpResponse(status=204)
+
+
 @require_POST
 def witness(request):
     """Record a first-time view from a device for a given note.
@@ -192,41 +266,117 @@ def witness(request):
 
     if not device_id or not note_id:
         return JsonResponse({"ok": False, "error": "missing_fields"}, status=400)
-
-    try:
-        note = Note.objects.get(pk=note_id)
-    except Note.DoesNotExist:
+    device_id = parse_device_id(device_id)
+    if device_id is None:
+        return JsonResponse({"ok": False, "error": "invalid_device_id"}, status=400)
+
+    # Known repeat: answer without touching the database (no count to report).
+    if (note_id, device_id) in seen_views:
+        return JsonResponse({"ok": True, "already": True})
+
+    if counters.enabled():
+        try:
+            note = Note.objects.get(pk=note_id)
+        except Note.DoesNotExist:
+            return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+        added = counters.buffer.add_view(note.pk, device_id)
+        seen_views.add((note.pk, device_id), note.pub_date)
+        views = note.views + counters.buffer.pending_views(note.pk)
+        if not added:
+            return JsonResponse({"ok": True, "already": True, "views": views})
+        return JsonResponse({"ok": True, "views": views})
+
+    views, created, pub_date = run_write(NoteView.record, note_id, device_id)
+    if views is None:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    seen_views.add((note_id, device_id), pub_date)
+    if not created:
+        # Already witnessed; ignore
+        return JsonResponse({"ok": True, "already": True, "views": views})
+    transaction.on_commit(bump_feed_version)
+    return JsonResponse({"ok": True, "views": views})
+
+
+def _record_views(note_ids, device_id) -> None:
+    # One write transaction for the whole batch.
+    with transaction.atomic():
+        # Compacted notes count the device in their sketch rather than a new row.
+        note_ids = set(note_ids) - NoteViewSketch.absorb({pk: [device_id] for pk in note_ids}).keys()
+        NoteView.objects.bulk_create(
+            [NoteView(note_id=pk, device_id=device_id) for pk in note_ids],
+            ignore_conflicts=True,
+        )
+        Note.objects.filter(pk__in=note_ids).update(views=F("views") + 1)
+        transaction.on_commit(bump_feed_version)
+
+
+@require_POST
+def witness_batch(request):
+    """Record first-time views from a device for several notes in one request.
 
+    Expects form data: device_id, note_ids (comma-separated, at most
+    WITNESS_BATCH_MAX). Unknown note ids are ignored.
+    Returns JSON { ok, views: { note_id: count } } for the notes that exist.
+    """
+    device_id = (request.POST.get("device_id") or "").strip()
     try:
-        with transaction.atomic():
-            NoteView.objects.create(note=note, device_id=device_id)
-            Note.objects.filter(pk=note.pk).update(views=F("views") + 1)
-    except IntegrityError:
-        # Already witnessed; ignore
+        note_ids = {int(part) for part in (request.POST.get("note_ids") or "").split(",") if part.strip()}
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid_payload"}, status=400)
+
+    if not device_id or not note_ids:
+        return JsonResponse({"ok": False, "error": "missing_fields"}, status=400)
+    if len(note_ids) > settings.WITNESS_BATCH_MAX:
+        return JsonResponse({"ok": False, "error": "too_many"}, status=400)
+    device_id = parse_device_id(device_id)
+    if device_id is None:
+        return JsonResponse({"ok": False, "error": "invalid_device_id"}, status=400)
+
+    # Read which notes exist and which this device already saw before taking the
+    # write lock. Two overlapping batches from the same device could both count a
+    # note; the client dedupes per device, so that's an accepted approximation.
+    existing = dict(Note.objects.filter(pk__in=note_ids).values_list("pk", "pub_date"))
+    unknown = {pk for pk in existing if (pk, device_id) not in seen_views}
+    if counters.enabled():
+        for pk in unknown:
+            counters.buffer.add_view(pk, device_id)
+            seen_views.add((pk, device_id), existing[pk])
+        views = dict(Note.objects.filter(pk__in=existing).values_list("pk", "views"))
         return JsonResponse(
-            {"ok": True, "already": True, "views": note.views}, status=200
+            {"ok": True, "views": {str(pk): count + counters.buffer.pending_views(pk) for pk, count in views.items()}}
         )
 
-    # Fetch updated count
-    note.refresh_from_db(fields=["views"])
-    return JsonResponse({"ok": True, "views": note.views})
+    seen = set()
+    if unknown:
+        seen = set(
+            NoteView.objects.filter(note_id__in=unknown, device_id=device_id).values_list("note_id", flat=True)
+        )
+    new_ids = unknown - seen
+
+    if new_ids:
+        run_write(_record_views, new_ids, device_id)
+    for pk in unknown:
+        seen_views.add((pk, device_id), existing[pk])
+
+    views = dict(Note.objects.filter(pk__in=existing).values_list("pk", "views"))
+    return JsonResponse({"ok": True, "views": {str(pk): count for pk, count in views.items()}})
 
 
 @require_POST
 def delete_note(request):
     """Delete a note if and only if the caller's device_id matches creator.
 
-    Expects form or x-www-form-urlencoded with: note_id, device_id
+    Expects form or x-www-form-urlencoded with: note_id, device_id (only needed
+    for anonymous notes; notes with an owner are deleted by the signed-in owner).
     Returns JSON { ok: bool } with 200 on success, 403 on forbidden, 404 if missing.
     """
     try:
         note_id = int(request.POST.get("note_id"))
-        device_id = (request.POST.get("device_id") or "").strip()
     except (TypeError, ValueError):
         return JsonResponse({"ok": False, "error": "invalid_payload"}, status=400)
+    device_id = parse_device_id(request.POST.get("device_id"))
 
-    if not note_id or not device_id:
+    if not note_id:
         return JsonResponse({"ok": False, "error": "missing_fields"}, status=400)
 
     try:
@@ -248,7 +398,7 @@ def delete_note(request):
 
     else:
         # if the note is anonymous, only the device that created it can delete it
-        if not note.created_device_id or note.created_device_id != device_id:
+        if device_id is None or note.created_device_id != device_id:
             return JsonResponse(
                 {
                     "ok": False,
@@ -258,7 +408,7 @@ def delete_note(request):
                 status=403,
             )
 
-    note.delete()
+    run_write(note.delete)
     return JsonResponse({"ok": True})
 
 
@@ -273,24 +423,22 @@ def flag_note(request):
 
     if not note_id or not device_id:
         return JsonResponse({"ok": False, "error": "missing_fields"}, status=400)
-
-    try:
-        note = Note.objects.get(pk=note_id)
-    except Note.DoesNotExist:
+    device_id = parse_device_id(device_id)
+    if device_id is None:
+        return JsonResponse({"ok": False, "error": "invalid_device_id"}, status=400)
+
+    if counters.enabled():
+        try:
+            note = Note.objects.get(pk=note_id)
+        except Note.DoesNotExist:
+            return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+        flagged = counters.buffer.toggle_flag(note.pk, device_id)
+        flags = max(note.flags + counters.buffer.pending_flag_delta(note.pk), 0)
+        return JsonResponse({"ok": True, "flags": flags, "flagged": flagged})
+
+    # Flag, or unflag if this device already flagged the note.
+    flags, flagged = run_write(NoteFlag.toggle, note_id, device_id)
+    if flags is None:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
-
-    # Try to create a flag; if it already exists, unflag instead.
-    try:
-        with transaction.atomic():
-            NoteFlag.objects.create(note=note, device_id=device_id)
-            Note.objects.filter(pk=note.pk).update(flags=F("flags") + 1)
-            note.refresh_from_db(fields=["flags"])
-            return JsonResponse({"ok": True, "flags": note.flags, "flagged": True})
-    except IntegrityError:
-        # Already flagged by this device — unflag (delete) and decrement count if possible.
-        with transaction.atomic():
-            NoteFlag.objects.filter(note=note, device_id=device_id).delete()
-            # Prevent negative values.
-            Note.objects.filter(pk=note.pk, flags__gt=0).update(flags=F("flags") - 1)
-            note.refresh_from_db(fields=["flags"])
-            return JsonResponse({"ok": True, "flags": note.flags, "flagged": False})
+    transaction.on_commit(bump_feed_version)
+    return JsonResponse({"ok": True, "flags": flags, "flagged": flagged})
@@ -0,0 +1,154 @@
+"""Single writer thread with group commit (opt-in).
+
+SQLite allows one writer at a time; with several request threads writing, each
+waits on the database lock (up to busy_timeout) and commits on its own. With
+``WRITE_QUEUE_ENABLED`` the write views hand their mutation to ``run_write``,
+which queues it for one writer thread per process. The writer drains whatever
+is queued into a single transaction, each job in its own savepoint so one
+failing job doesn't undo the others, commits once, and hands every job's result
+(or exception) back to the waiting request.
+
+A request that waits longer than ``WRITE_QUEUE_TIMEOUT_SECONDS`` gets
+``WriteQueueTimeout`` (a 503, see ``aether_notes.middleware``). If its job
+hadn't started it is cancelled and will never run; if it had, it may still
+commit after the request has failed.
+
+With the queue disabled ``run_write`` simply calls the function. Either way the
+time spent is recorded for the request's ``Server-Timing`` header (see
+``aether_notes.middleware``).
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds spent in run_write during the current request; set by the middleware.
+write_timings: contextvars.ContextVar[list[float] | None] = contextvars.ContextVar("write_timings", default=None)
+
+
+class WriteQueueTimeout(Exception):
+    """run_write stopped waiting for the writer thread.
+
+    ``started`` tells whether the job was already running: if not, it was
+    cancelled and nothing was written; if so, it may still commit.
+    """
+
+    def __init__(self, started: bool):
+        self.started = started
+        super().__init__("write still running" if started else "write cancelled before it started")
+
+
+class Writer:
+    def __init__(self):
+        self._queue: queue.SimpleQueue[tuple[Future, Callable, tuple, dict]] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def in_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _run(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < settings.WRITE_QUEUE_MAX_BATCH:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(jobs)
+
+    def _commit(self, jobs) -> None:
+        results = []
+        committed = []
+        try:
+            with transaction.atomic():
+                # Runs first after COMMIT, so a failing on_commit callback of some
+                # job can't be mistaken for a failed commit.
+                transaction.on_commit(lambda: committed.append(True), robust=True)
+                for future, fn, args, kwargs in jobs:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            results.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:  # noqa: BLE001 - handed back to the caller
+                        results.append((future, None, e))
+        except Exception as e:  # noqa: BLE001
+            if committed:
+                logger.exception("on_commit callback failed after a group commit")
+                self._resolve(results)
+                return
+            logger.exception("Group commit of %d write(s) failed", len(jobs))
+            for future, _, _, _ in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            # Start the next batch on a fresh connection.
+            connection.close()
+            return
+        self._resolve(results)
+
+    @staticmethod
+    def _resolve(results) -> None:
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+writer = Writer()
+
+
+def run_write(fn, *args, **kwargs):
+    """Run the write ``fn(*args, **kwargs)`` and return its result.
+
+    Goes through the writer thread when the queue is enabled, unless the caller
+    is already in a transaction (the work must see it) or is the writer itself.
+    Raises WriteQueueTimeout if the writer doesn't get to it in time.
+    """
+    start = time.perf_counter()
+    try:
+        if (
+            not settings.WRITE_QUEUE_ENABLED
+            or writer.in_writer_thread()
+            or connection.in_atomic_block
+        ):
+            return fn(*args, **kwargs)
+        future = writer.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise WriteQueueTimeout(started=False) from None
+        try:
+            # Running (or it finished just now): don't wait any longer.
+            return future.result(timeout=0)
+        except FutureTimeoutError:
+            raise WriteQueueTimeout(started=True) from None
+    finally:
+        timings = write_timings.get()
+        if timings is not None:
+            timings.append((time.perf_counter() - start) * 1000)
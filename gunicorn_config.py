@@ -15,3 +15,40 @@ loglevel = "info"
 # Performance tuning
 worker_class = "gthread"  # Use threading worker
 worker_connections = 1000
+
+
+def post_worker_init(worker):
+    # Warm the home feed cache so the first visitors don't pay for the rebuild.
+    try:
+        from django.db import connections
+        from aether_notes.feed_cache import warm_feed_cache
+
+        warm_feed_cache()
+        connections.close_all()
+    except Exception as e:  # noqa: BLE001
+        worker.log.warning("Feed cache warm-up failed: %s", e)
+
+    # Optional in-process expiry sweeper (one worker, so it runs once per server).
+    from django.conf import settings
+
+    if settings.EXPIRY_SWEEP_INTERVAL_SECONDS > 0:
+        from aether_notes.maintenance import start_expiry_sweeper
+
+        start_expiry_sweeper(settings.EXPIRY_SWEEP_INTERVAL_SECONDS)
+
+    # Crossposts queued before the last worker recycle are picked up right away.
+    if settings.CROSSPOST_WORKERS > 0:
+        from accounts.crosspost import pool
+
+        pool.start(settings.CROSSPOST_WORKERS)
+
+
+def worker_exit(server, worker):
+    # Write out any buffered witness/flag counts before the worker goes away.
+    try:
+        from aether_notes import counters
+
+        if counters.enabled():
+            counters.buffer.flush()
+    except Exception as e:  # noqa: BLE001
+        worker.log.warning("Counter flush on exit failed: %s", e)